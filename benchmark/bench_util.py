@@ -0,0 +1,68 @@
+# coding:utf-8
+"""
+基准测试公用工具
+"""
+import math
+import os
+import sys
+from collections import Counter
+
+# 保证以脚本方式运行时能导入项目模块
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+
+def load_sample(path: str, size: int) -> list:
+    """
+    读取语言文件并按键排序取前size条，保证每次测试样本固定
+    :return list[(键, 原文)]
+    """
+    from common.util import Lang
+    lang = Lang()
+    lang.read_lang(path)
+    items = sorted(lang.lang_dic.items())
+    return [(k, v) for k, v in items if isinstance(v, str) and v.strip()][:size]
+
+
+def load_reference(path: str, keys: list) -> list:
+    """
+    读取参考译文，缺失的键返回None
+    """
+    from common.util import Lang
+    lang = Lang()
+    lang.read_lang(path)
+    return [lang.lang_dic.get(key) for key in keys]
+
+
+def char_bleu(hypotheses: list, references: list, max_n: int = 4) -> float:
+    """
+    字符级corpus BLEU，中文无需分词
+    """
+    clipped = [0] * max_n
+    total = [0] * max_n
+    hyp_len = ref_len = 0
+    for hyp, ref in zip(hypotheses, references):
+        if ref is None:
+            continue
+        hyp_len += len(hyp)
+        ref_len += len(ref)
+        for n in range(1, max_n + 1):
+            hyp_ngrams = Counter(hyp[i:i + n] for i in range(len(hyp) - n + 1))
+            ref_ngrams = Counter(ref[i:i + n] for i in range(len(ref) - n + 1))
+            clipped[n - 1] += sum(min(c, ref_ngrams[g]) for g, c in hyp_ngrams.items())
+            total[n - 1] += max(len(hyp) - n + 1, 0)
+    if hyp_len == 0 or 0 in clipped:
+        return 0.0
+    log_precision = sum(math.log(clipped[i] / total[i]) for i in range(max_n)) / max_n
+    brevity = 1.0 if hyp_len > ref_len else math.exp(1 - ref_len / hyp_len)
+    return round(100 * brevity * math.exp(log_precision), 2)
+
+
+def percentile(values: list, p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(p / 100 * len(ordered)) - 1))
+    return ordered[index]
@@ -0,0 +1,52 @@
+# coding:utf-8
+"""
+离线翻译解码预设对比：吞吐量与质量
+用法: python benchmark/decode_preset_benchmark.py en_us.json [--ref zh_cn.json] [--api 1] [--size 500]
+未提供参考译文时以质量预设的输出作为参考
+"""
+import argparse
+import time
+
+from bench_util import load_sample, load_reference, char_bleu
+from common.config import cfg
+from common.model_registry import DECODE_PRESETS
+from common.util import Translator
+
+PRESET_NAMES = {'0': '快速', '1': '均衡', '2': '质量'}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('lang', help='英文语言文件')
+    parser.add_argument('--ref', help='参考译文语言文件', default=None)
+    parser.add_argument('--api', help='1-PyTorch 3-CTranslate2 int8', default='1', choices=['1', '3'])
+    parser.add_argument('--size', type=int, default=500)
+    args = parser.parse_args()
+
+    # 关闭备用接口，避免失败的请求被其它接口翻译而混入结果，仅修改内存中的配置
+    cfg.set(cfg.fallbackApi, '-1', save=False)
+    sample = load_sample(args.lang, args.size)
+    keys = [item[0] for item in sample]
+    texts = [item[1] for item in sample]
+    chars = sum(len(text) for text in texts)
+
+    translator = Translator('en', 'zh', '', '', api=args.api)
+    translator.engine_batch_translate(texts[:8])  # 预热，绕过翻译记忆库
+    outputs = {}
+    costs = {}
+    for preset in DECODE_PRESETS:
+        translator.decode_preset = preset
+        t0 = time.time()
+        outputs[preset] = translator.engine_batch_translate(texts)
+        costs[preset] = time.time() - t0
+    references = load_reference(args.ref, keys) if args.ref else outputs['2']
+
+    print(f'样本: {len(texts)}条, {chars}字符')
+    print('%-6s %10s %12s %8s' % ('预设', 'lines/sec', 'chars/sec', 'BLEU'))
+    for preset in DECODE_PRESETS:
+        print('%-6s %10.1f %12.1f %8.2f' % (PRESET_NAMES[preset], len(texts) / costs[preset], chars / costs[preset],
+                                           char_bleu(outputs[preset], references)))
+
+
+if __name__ == '__main__':
+    main()
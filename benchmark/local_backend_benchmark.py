@@ -0,0 +1,49 @@
+# coding:utf-8
+"""
+离线翻译后端对比：PyTorch(translateApi=1) 与 CTranslate2 int8(translateApi=3)
+用法: python benchmark/local_backend_benchmark.py en_us.json [--ref zh_cn.json] [--size 500]
+未提供参考译文时以PyTorch输出作为参考，衡量int8量化带来的质量损失
+"""
+import argparse
+import time
+
+from bench_util import load_sample, load_reference, char_bleu
+from common.config import cfg
+from common.util import Translator
+
+
+def run_backend(api: str, texts: list):
+    translator = Translator('en', 'zh', '', '', api=api)
+    translator.engine_batch_translate(texts[:8])  # 预热，绕过翻译记忆库
+    t0 = time.time()
+    outputs = translator.engine_batch_translate(texts)
+    cost = time.time() - t0
+    return outputs, cost
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('lang', help='英文语言文件')
+    parser.add_argument('--ref', help='参考译文语言文件', default=None)
+    parser.add_argument('--size', type=int, default=500)
+    args = parser.parse_args()
+
+    # 关闭备用接口，避免失败的请求被其它接口翻译而混入结果，仅修改内存中的配置
+    cfg.set(cfg.fallbackApi, '-1', save=False)
+    sample = load_sample(args.lang, args.size)
+    keys = [item[0] for item in sample]
+    texts = [item[1] for item in sample]
+    chars = sum(len(text) for text in texts)
+
+    torch_outputs, torch_cost = run_backend('1', texts)
+    ct2_outputs, ct2_cost = run_backend('3', texts)
+    references = load_reference(args.ref, keys) if args.ref else torch_outputs
+
+    print(f'样本: {len(texts)}条, {chars}字符')
+    print('%-12s %12s %8s' % ('后端', 'chars/sec', 'BLEU'))
+    for name, outputs, cost in [('torch', torch_outputs, torch_cost), ('ct2-int8', ct2_outputs, ct2_cost)]:
+        print('%-12s %12.1f %8.2f' % (name, chars / cost, char_bleu(outputs, references)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+# coding:utf-8
+"""
+本地模拟翻译服务，模仿百度OAuth/texttrans与OpenAI chat completions接口
+用于在没有密钥和网络的情况下测试吞吐量、并发与重试
+用法: python benchmark/mock_server.py [--port 8765] [--latency 200] [--jitter 100] [--error-rate 0.01] [--qps 20]
+百度接口地址填 http://127.0.0.1:8765 ，OpenAI接口地址填 http://127.0.0.1:8765/v1
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from collections import Counter, deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse
+
+
+def fake_translate(text_: str) -> str:
+    return '[zh]' + text_
+
+
+class MockState:
+    """
+    模拟服务的配置与统计
+    """
+
+    def __init__(self, latency: float, jitter: float, error_rate: float, qps: int):
+        self.latency = latency / 1000
+        self.jitter = jitter / 1000
+        self.error_rate = error_rate
+        self.qps = qps
+        self.window = deque()  # 最近一秒内请求的时间戳
+        self.stats = Counter()
+        self.lock = threading.Lock()
+
+    def admit(self) -> bool:
+        # 超出QPS时拒绝请求
+        if not self.qps:
+            return True
+        with self.lock:
+            now = time.monotonic()
+            while self.window and now - self.window[0] > 1:
+                self.window.popleft()
+            if len(self.window) >= self.qps:
+                return False
+            self.window.append(now)
+            return True
+
+    def delay(self):
+        time.sleep(max(0.0, random.gauss(self.latency, self.jitter)))
+
+    def count(self, name: str):
+        with self.lock:
+            self.stats[name] += 1
+
+
+def make_handler(state: MockState):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # 支持长连接
+
+        def log_message(self, format_, *args):
+            pass
+
+        def send_json(self, data, status=200):
+            body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json;charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def read_json(self):
+            length = int(self.headers.get('Content-Length', 0))
+            return json.loads(self.rfile.read(length) or b'{}')
+
+        def do_GET(self):
+            if urlparse(self.path).path == '/oauth/2.0/token':
+                state.count('oauth')
+                self.send_json({"access_token": "mock-token", "expires_in": 2592000})
+            else:
+                self.send_json({"error": "not found"}, 404)
+
+        def do_POST(self):
+            path = urlparse(self.path).path
+            body = self.read_json()
+            if path == '/rpc/2.0/mt/texttrans/v1':
+                self.handle_baidu(body)
+            elif path.endswith('/chat/completions'):
+                self.handle_openai(body)
+            else:
+                self.send_json({"error": "not found"}, 404)
+
+        def handle_baidu(self, body: dict):
+            state.count('baidu')
+            if not state.admit():
+                state.count('baidu_throttled')
+                return self.send_json({"error_code": 18, "error_msg": "Open api qps request limit reached"})
+            state.delay()
+            if random.random() < state.error_rate:
+                state.count('baidu_error')
+                return self.send_json({"error_code": 282000, "error_msg": "internal error"})
+            lines = body.get('q', '').split('\n')
+            self.send_json({"result": {"from": body.get('from'), "to": body.get('to'),
+                                       "trans_result": [{"src": line, "dst": fake_translate(line)}
+                                                        for line in lines]},
+                            "log_id": random.randint(0, 1 << 32)})
+
+        def handle_openai(self, body: dict):
+            state.count('openai')
+            if not state.admit():
+                state.count('openai_throttled')
+                return self.send_json({"error": {"message": "Rate limit reached", "type": "requests",
+                                                 "code": "rate_limit_exceeded"}}, 429)
+            state.delay()
+            if random.random() < state.error_rate:
+                state.count('openai_error')
+                return self.send_json({"error": {"message": "internal error", "type": "server_error"}}, 500)
+            prompt = ''.join(message['content'] for message in body['messages'])
+            text_ = body['messages'][-1]['content']  # 术语表在单独的系统消息中，最后一条即为原文
+            try:
+                items = json.loads(text_)
+            except ValueError:
+                items = None
+            if isinstance(items, list):
+                content = json.dumps([{"k": item['k'], "t": fake_translate(item['t'])} for item in items],
+                                     ensure_ascii=False)
+            else:
+                content = fake_translate(text_)
+            self.send_json({
+                "id": "chatcmpl-mock", "object": "chat.completion", "created": int(time.time()),
+                "model": body.get('model', 'mock'),
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": content}}],
+                "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(content) // 4,
+                          "total_tokens": (len(prompt) + len(content)) // 4}
+            })
+
+    return Handler
+
+
+def start_server(port: int = 0, latency: float = 200, jitter: float = 100, error_rate: float = 0.0, qps: int = 0):
+    """
+    在后台线程中启动模拟服务
+    :return tuple(服务对象, 状态统计)，服务实际端口为server.server_port
+    """
+    state = MockState(latency, jitter, error_rate, qps)
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=200, help='平均延迟(毫秒)')
+    parser.add_argument('--jitter', type=float, default=100, help='延迟标准差(毫秒)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='随机出错的概率')
+    parser.add_argument('--qps', type=int, default=0, help='每秒请求上限，为0时不限')
+    args = parser.parse_args()
+    server, state = start_server(args.port, args.latency, args.jitter, args.error_rate, args.qps)
+    print(f'模拟服务已启动: http://127.0.0.1:{server.server_port}')
+    try:
+        while True:
+            time.sleep(10)
+            print(dict(state.stats))
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+# coding:utf-8
+"""
+占位符处理单条开销对比：旧版多次正则替换 与 单次扫描的PlaceholderMasker
+用法: python benchmark/placeholder_benchmark.py [--lang en_us.json] [--size 20000]
+"""
+import argparse
+import re
+import time
+
+from bench_util import load_sample
+from common.placeholder import PlaceholderMasker, MAGIC_WORD
+
+SAMPLE = [
+    'Right-click to open',
+    '&aSneak&r + &bRight-click&r to toggle the &6Magnet&r mode',
+    'Craft a #minecraft:planks into %s sticks, see https://ftb.team/wiki',
+    'Stores up to %1$s mB of fluid ({0} buckets)',
+    'A plain sentence about the Nether without anything to protect.',
+]
+
+
+def legacy_pre_process(line: str):
+    # 旧版Translator.pre_process(远程接口路径)
+    if line.find('.jpg') + line.find('.png') != -2:
+        return None
+    if line.find(r'{\"') != -1:
+        return None
+    line = line.replace('\\\\&', 'PPP')
+    pattern = re.compile(r'&([a-z,0-9]|#[0-9,A-F]{6})')
+    line = pattern.sub(lambda m: "[&" + m.group(0) + "]", line)
+    line = re.sub(r'#\w+:\w+\b', MAGIC_WORD, re.sub(r'\\"', '\"', line))
+    pattern = re.compile(r'(http|https)://(?:[-\w.]|(?:%[\da-fA-F]{2}))+')
+    if re.search(pattern, line):
+        return None
+    return line
+
+
+def legacy_post_process(text_, translate):
+    # 旧版Translator.post_process
+    pattern = re.compile(r'\[&&([a-z,0-9]|#[0-9,A-F]{6})]')
+    translate = pattern.sub(lambda m: m.group(0)[2:-1], translate)
+    text_ = pattern.sub(lambda m: m.group(0)[2:-1], text_)
+    text_ = re.sub(r'(["\'])', r'\\\g<1>', text_)
+    quotes = re.findall(r'#\w+:\w+\b', text_)
+    if len(quotes) > 0:
+        count = 0
+        index = translate.find(MAGIC_WORD)
+        while index != -1:
+            translate = re.sub(MAGIC_WORD, quotes[count], translate, 1)
+            count = count + 1
+            index = translate.find(MAGIC_WORD)
+    return translate
+
+
+def run_legacy(texts: list):
+    for text_ in texts:
+        processed = legacy_pre_process(text_)
+        if processed is not None:
+            legacy_post_process(text_, processed)
+
+
+def run_masker(texts: list):
+    masker = PlaceholderMasker()
+    masked = masker.mask_batch(texts)
+    masker.unmask_batch([item[0] for item in masked], [item[1] for item in masked])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lang', help='英文语言文件，缺省时使用内置样本', default=None)
+    parser.add_argument('--size', type=int, default=20000)
+    args = parser.parse_args()
+
+    if args.lang:
+        texts = [item[1] for item in load_sample(args.lang, args.size)]
+    else:
+        texts = (SAMPLE * (args.size // len(SAMPLE) + 1))[:args.size]
+
+    print(f'样本: {len(texts)}条')
+    for name, func in [('legacy', run_legacy), ('masker', run_masker)]:
+        t0 = time.perf_counter()
+        func(texts)
+        cost = time.perf_counter() - t0
+        print('%-8s %8.2f us/条' % (name, cost / len(texts) * 1e6))
+
+
+if __name__ == '__main__':
+    main()
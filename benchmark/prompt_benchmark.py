@@ -0,0 +1,93 @@
+# coding:utf-8
+"""
+OpenAI提示词token数对比：旧格式(每条缩进JSON+完整任务说明)与PromptBuilder生成的精简格式
+用法: python benchmark/prompt_benchmark.py en_us.json [--size 500] [--batch 20]
+安装了tiktoken时按cl100k_base计数，否则按每4字符1个token估算
+"""
+import argparse
+import json
+
+from bench_util import load_sample
+from common.placeholder import MAGIC_WORD
+from common.prompt_builder import SYSTEM_PROMPT
+from common.usage_ledger import estimate_tokens
+from common.util import global_aca, prompt_builder
+
+try:
+    import tiktoken
+    ENCODING = tiktoken.get_encoding('cl100k_base')
+except ImportError:
+    ENCODING = None
+
+MESSAGE_OVERHEAD = 4  # 每条消息的角色与分隔符
+
+
+def count_tokens(messages: list) -> int:
+    total = 0
+    for message in messages:
+        content = message['content']
+        total += MESSAGE_OVERHEAD + (len(ENCODING.encode(content)) if ENCODING else estimate_tokens(len(content)))
+    return total
+
+
+def legacy_single(text: str) -> list:
+    ref_data = [f'{item[1][0]}:{str(item[1][1])}' for item in global_aca.find(text.lower())]
+    prompt_dict = {
+        "tasks": f"Translate the text below about minecraft into Chinese\n"
+                 f"You can choose whether to refer to the following terms based on the context yourself:\n"
+                 f"Keep every {MAGIC_WORD} unchanged\n"
+                 f"Do not return any other content besides the translated text\n",
+        "terms": '\n'.join(ref_data),
+        "text": text
+    }
+    return [{"role": "user", "content": json.dumps(prompt_dict, indent=2, ensure_ascii=False)}]
+
+
+def legacy_batch(items: list) -> list:
+    ref_data = []
+    for item in items:
+        for term in global_aca.find(item['text'].lower()):
+            ref = f'{term[1][0]}:{str(term[1][1])}'
+            if ref not in ref_data:
+                ref_data.append(ref)
+    prompt_dict = {
+        "tasks": f"Translate the \"text\" of every item below about minecraft into Chinese\n"
+                 f"You can choose whether to refer to the following terms based on the context yourself:\n"
+                 f"Keep every {MAGIC_WORD} unchanged\n"
+                 f"Return only a JSON array of objects with the same \"key\" and the translated \"text\"\n",
+        "terms": '\n'.join(ref_data),
+        "items": items
+    }
+    return [{"role": "user", "content": json.dumps(prompt_dict, indent=2, ensure_ascii=False)}]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('lang', help='英文语言文件')
+    parser.add_argument('--size', type=int, default=500)
+    parser.add_argument('--batch', type=int, default=20)
+    args = parser.parse_args()
+
+    sample = load_sample(args.lang, args.size)
+    rows = len(sample)
+    legacy_single_tokens = sum(count_tokens(legacy_single(text)) for _, text in sample)
+    new_single_tokens = sum(count_tokens(prompt_builder.single_messages(text)) for _, text in sample)
+    legacy_batch_tokens = 0
+    new_batch_tokens = 0
+    for start in range(0, rows, args.batch):
+        chunk = sample[start:start + args.batch]
+        legacy_batch_tokens += count_tokens(legacy_batch([{"key": key, "text": text} for key, text in chunk]))
+        new_batch_tokens += count_tokens(prompt_builder.batch_messages([text for _, text in chunk])[0])
+
+    print(f'样本: {rows}条, 计数方式: {"tiktoken" if ENCODING else "估算"}')
+    # OpenAI只缓存1024 tokens以上的相同前缀，固定指令低于该门槛时不会命中缓存
+    fixed_tokens = count_tokens([{"content": SYSTEM_PROMPT}])
+    print(f'固定指令(系统消息): {fixed_tokens} tokens，{"可" if fixed_tokens >= 1024 else "低于1024 tokens，不会"}被服务端缓存')
+    print('%-8s %14s %14s %14s' % ('模式', '旧tokens/条', '新tokens/条', '节省tokens/条'))
+    for name, legacy, new in [('逐条', legacy_single_tokens, new_single_tokens),
+                              (f'批量{args.batch}', legacy_batch_tokens, new_batch_tokens)]:
+        print('%-8s %14.1f %14.1f %14.1f' % (name, legacy / rows, new / rows, (legacy - new) / rows))
+
+
+if __name__ == '__main__':
+    main()
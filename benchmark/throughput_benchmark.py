@@ -0,0 +1,97 @@
+# coding:utf-8
+"""
+远程接口吞吐量测试：在本地启动模拟服务，测量百度(translateApi=0)与OpenAI(translateApi=2)的处理速度
+用法: python benchmark/throughput_benchmark.py [--lang en_us.json] [--size 2000] [--api 0 2]
+      [--latency 200] [--jitter 100] [--error-rate 0.01] [--qps 20] [--endpoints 2]
+未提供语言文件时使用生成的文本；以LangTranslateThread完整执行一次翻译，工作目录指向临时目录，
+翻译记忆库、缓存与用量台账均从空白开始，且不影响真实的工作目录
+"""
+import argparse
+import shutil
+import tempfile
+import time
+
+from bench_util import load_sample, percentile
+from mock_server import start_server
+from common.config import cfg
+from common.util import Lang, LangTranslateThread
+
+
+def synthetic_sample(size: int) -> list:
+    return [(f'item.mock.{i}', f'Mock item number {i} used for load testing') for i in range(size)]
+
+
+def run_api(api: str, sample: list, work_folder: str):
+    """
+    在当前线程中同步执行LangTranslateThread.run()
+    :return tuple(总耗时, 每块耗时列表, 翻译线程, 错误信息列表)
+    """
+    lang = Lang()
+    lang.set_lang(dict(sample), f'{work_folder}/throughput_{api}.json')
+    thread = LangTranslateThread(lang, 'en', 'zh', 'mock-key', 'mock-secret', api=api)
+    chunk_costs = []
+    errors = []
+    last = [time.perf_counter()]
+
+    def handle_chunk_done(_):
+        # 每翻译完一块发出一次剩余时间
+        now = time.perf_counter()
+        chunk_costs.append(now - last[0])
+        last[0] = now
+
+    thread.remain_time.connect(handle_chunk_done)
+    thread.error.connect(errors.append)
+    t0 = last[0] = time.perf_counter()
+    thread.run()
+    return time.perf_counter() - t0, chunk_costs, thread, errors
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lang', help='英文语言文件', default=None)
+    parser.add_argument('--size', type=int, default=2000)
+    parser.add_argument('--api', nargs='+', default=['0', '2'])
+    parser.add_argument('--latency', type=float, default=200, help='模拟服务平均延迟(毫秒)')
+    parser.add_argument('--jitter', type=float, default=100, help='模拟服务延迟标准差(毫秒)')
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--qps', type=int, default=0, help='模拟服务每秒请求上限，为0时不限')
+    parser.add_argument('--endpoints', type=int, default=1, help='OpenAI模拟接口个数，用于测试负载均衡')
+    args = parser.parse_args()
+
+    servers = [start_server(0, args.latency, args.jitter, args.error_rate, args.qps)
+               for _ in range(max(1, args.endpoints))]
+    urls = [f'http://127.0.0.1:{server.server_port}' for server, _ in servers]
+    # 仅修改内存中的配置，不写回配置文件
+    cfg.set(cfg.baiduUrl, urls[0], save=False)
+    cfg.set(cfg.openaiUrl, f'{urls[0]}/v1', save=False)
+    cfg.set(cfg.openaiEndpoints, ';'.join(f'{url}/v1,mock-key' for url in urls) if len(urls) > 1 else '',
+            save=False)
+    cfg.set(cfg.secretKey, 'mock-key', save=False)
+    cfg.set(cfg.fallbackApi, '-1', save=False)  # 只测量被测接口本身，失败的请求不交给备用接口
+    cfg.set(cfg.baiduMonthlyCap, 0, save=False)
+    cfg.set(cfg.gptMonthlyCap, 0, save=False)
+    work_folder = tempfile.mkdtemp(prefix='mplt-bench-')
+    cfg.set(cfg.workFolder, work_folder, save=False)
+
+    sample = load_sample(args.lang, args.size) if args.lang else synthetic_sample(args.size)
+    texts = [item[1] for item in sample]
+    print(f'样本: {len(texts)}条, 模拟延迟{args.latency}±{args.jitter}ms, 错误率{args.error_rate}, QPS上限{args.qps}')
+    print('%-6s %10s %10s %10s %10s' % ('接口', 'rows/sec', 'p50', 'p95', 'p99'))
+    for api in args.api:
+        for _, state in servers:
+            state.stats.clear()
+        cost, chunk_costs, thread, errors = run_api(api, sample, work_folder)
+        print('%-6s %10.1f %9.2fs %9.2fs %9.2fs' % (api, len(texts) / cost, percentile(chunk_costs, 50),
+                                                    percentile(chunk_costs, 95), percentile(chunk_costs, 99)))
+        print('       %s' % thread.translator.latency.summary())
+        for error in errors:
+            print('       出错: %s' % error)
+        for url, (_, state) in zip(urls, servers):
+            print('       服务端%s: %s' % (url, dict(state.stats)))
+    for server, _ in servers:
+        server.shutdown()
+    shutil.rmtree(work_folder, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
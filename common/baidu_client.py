@@ -0,0 +1,148 @@
+# coding:utf-8
+import re
+
+from common.engine_session import engine_session, AUTH_ERROR_CODES, THROTTLE_ERROR_CODES
+from common.flow_control import ThrottledError, RetryPolicy, TokenBucket
+from common.usage_ledger import usage_ledger
+
+TRANSLATE_ERROR_PREFIX = '翻译出错：'
+NEWLINE_ESCAPE = '{br}'  # 打包时替换文本内部的换行，避免被当作分行
+NEWLINE_ESCAPE_PATTERN = re.compile(r'\s*\{\s*br\s*}\s*', re.IGNORECASE)
+
+
+def escape_newline(text_: str) -> str:
+    return text_.replace('\r\n', '\n').replace('\n', NEWLINE_ESCAPE)
+
+
+def unescape_newline(text_: str) -> str:
+    return NEWLINE_ESCAPE_PATTERN.sub('\n', text_)
+
+
+class BaiduClient:
+    """
+    百度机器翻译客户端
+    通过共享会话层复用连接池，并发数由调用方的调度器控制，每次HTTP请求前从令牌桶取令牌以限制QPS
+    """
+
+    def __init__(self, app_key: str, app_secret: str, from_lang: str, to_lang: str, pack_chars: int = 0,
+                 retry: RetryPolicy = None, timeout: float = 5, base_url: str = "https://aip.baidubce.com",
+                 limiter: TokenBucket = None):
+        """
+        :param pack_chars 每个请求打包的字符数上限，为0时每个请求只发送一条文本
+        :param retry 单个请求超时或限流时的重试策略
+        :param timeout 单个请求的超时时间
+        :param base_url 接口地址，测试时可指向本地模拟服务
+        :param limiter 限制QPS的令牌桶，重试、重新鉴权与逐条回退的请求同样需要取令牌
+        """
+        self.oauth_url = f"{base_url}/oauth/2.0/token"
+        self.api_url = f"{base_url}/rpc/2.0/mt/texttrans/v1"
+        self.app_key = app_key
+        self.app_secret = app_secret
+        self.from_lang = from_lang
+        self.to_lang = to_lang
+        self.access_token = None
+        self.pack_chars = pack_chars
+        self.retry = retry or RetryPolicy(0)
+        self.timeout = timeout
+        self.limiter = limiter
+
+    def get_access_token(self, stale: str = None):
+        self.access_token = engine_session.get_baidu_token(self.oauth_url, self.app_key, self.app_secret, stale)
+
+    def post(self, q: str) -> list:
+        """
+        发送一次翻译请求，q中每行对应返回的一条trans_result
+        """
+        try:
+            outputs = self.retry.call(self.post_once, q)
+        except Exception:
+            usage_ledger.record('0', errors=1)
+            raise
+        usage_ledger.record('0', chars=len(q))
+        return outputs
+
+    def post_once(self, q: str, retry_auth: bool = True) -> list:
+        headers = {
+            "Content-Type": "application/json;charset=utf-8"
+        }
+        body = {
+            "from": self.from_lang,
+            "to": self.to_lang,
+            "q": q
+        }
+        if not self.access_token:
+            self.get_access_token()
+        token = self.access_token
+        params_ = {
+            "access_token": token
+        }
+        if self.limiter:
+            self.limiter.acquire()
+        response_ = engine_session.session.post(self.api_url, headers=headers, params=params_, json=body,
+                                                timeout=self.timeout)
+        result_ = response_.json()
+        if retry_auth and result_.get("error_code") in AUTH_ERROR_CODES:
+            self.get_access_token(stale=token)
+            return self.post_once(q, retry_auth=False)
+        if result_.get("error_code") in THROTTLE_ERROR_CODES:
+            raise ThrottledError(result_.get("error_msg"))
+        return [item["dst"] for item in result_["result"]["trans_result"]]
+
+    def request(self, text_: str) -> str:
+        """
+        翻译单条文本，出错时返回错误信息而非抛出，避免中断整批
+        文本内部的换行会被拆成多条trans_result，需重新拼接
+        """
+        try:
+            translated_text = '\n'.join(self.post(text_))
+        except Exception as e:
+            translated_text = f"{TRANSLATE_ERROR_PREFIX}{str(e)}"
+        return translated_text
+
+    def pack(self, texts: list) -> list:
+        """
+        按字符预算将多条文本打包，每包以换行连接后在一个请求中发送
+        :return list[list[原文下标]]
+        """
+        packs = []
+        current = []
+        size = 0
+        for i, text_ in enumerate(texts):
+            length = len(escape_newline(text_)) + 1
+            if current and size + length > self.pack_chars:
+                packs.append(current)
+                current = []
+                size = 0
+            current.append(i)
+            size += length
+        if current:
+            packs.append(current)
+        return packs
+
+    def request_pack(self, lines: list) -> list:
+        """
+        翻译一包文本，返回行数对不上时退回逐条请求
+        """
+        if len(lines) == 1:
+            return [self.request(lines[0])]
+        try:
+            outputs = self.post('\n'.join(escape_newline(line) for line in lines))
+        except Exception:
+            outputs = []
+        if len(outputs) != len(lines):
+            return [self.request(line) for line in lines]
+        return [unescape_newline(output) for output in outputs]
+
+    def translate_many(self, texts: list) -> list:
+        """
+        翻译多条文本，返回结果与输入顺序一致
+        """
+        if not self.access_token:
+            self.get_access_token()
+        if self.pack_chars <= 0:
+            return [self.request(text_) for text_ in texts]
+        results = [''] * len(texts)
+        for pack in self.pack(texts):
+            for i, output in zip(pack, self.request_pack([texts[i] for i in pack])):
+                results[i] = output
+        return results
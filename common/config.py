@@ -1,7 +1,7 @@
 # coding:utf-8
 
 from qfluentwidgets import (qconfig, QConfig, ConfigItem, OptionsConfigItem, BoolValidator,
-                            OptionsValidator, FolderValidator)
+                            OptionsValidator, FolderValidator, RangeConfigItem, RangeValidator)
 
 
 class Config(QConfig):
@@ -22,14 +22,50 @@ class Config(QConfig):
     lowVersionLangFormat = ConfigItem("LangFormat", "LowVersionLangFormat", False, BoolValidator())
     # 翻译API
     translateApi = OptionsConfigItem(
-        "TranslateApi", "TranslateApi", "1", OptionsValidator(["0", "1", "2"]))
+        "TranslateApi", "TranslateApi", "1", OptionsValidator(["0", "1", "2", "3", "4"]))
+    # 单次接口调用的超时秒数与失败后的重试次数，离线翻译不受超时限制
+    requestTimeout = RangeConfigItem("TranslateApi", "RequestTimeout", 10, RangeValidator(1, 120))
+    maxRetries = RangeConfigItem("TranslateApi", "MaxRetries", 3, RangeValidator(0, 10))
+    # 翻译接口连续失败时改用的备用接口，-1为不使用
+    fallbackApi = OptionsConfigItem(
+        "TranslateApi", "FallbackApi", "-1", OptionsValidator(["-1", "0", "1", "2", "3"]))
+    # 离线翻译每批送入模型的条数
+    localBatchSize = RangeConfigItem("TranslateApi", "LocalBatchSize", 16, RangeValidator(1, 128))
+    # 启动时在后台预加载离线模型
+    preloadModel = ConfigItem("TranslateApi", "PreloadModel", True, BoolValidator())
+    # 离线翻译解码预设 0-快速 1-均衡 2-质量
+    decodePreset = OptionsConfigItem("TranslateApi", "DecodePreset", "0", OptionsValidator(["0", "1", "2"]))
+    # 编辑视图中预先翻译当前行之后的行数，为0时关闭，只对离线翻译生效
+    prefetchRows = RangeConfigItem("TranslateApi", "PrefetchRows", 10, RangeValidator(0, 50))
+    # 离线翻译使用的进程数，大于1时按进程切分任务
+    localWorkers = RangeConfigItem("TranslateApi", "LocalWorkers", 1, RangeValidator(1, 64))
+    # 百度翻译账户QPS上限与初始在途请求数(翻译时自动调整)
+    baiduQps = RangeConfigItem("TranslateApi", "BaiduQps", 10, RangeValidator(1, 100))
+    baiduConcurrency = RangeConfigItem("TranslateApi", "BaiduConcurrency", 4, RangeValidator(1, 32))
+    # 百度翻译单个请求打包的字符数，为0时不打包
+    baiduPackChars = RangeConfigItem("TranslateApi", "BaiduPackChars", 3000, RangeValidator(0, 5000))
+    # 百度翻译每月字符数上限(万字符)，达到后暂停翻译，为0时不限
+    baiduMonthlyCap = RangeConfigItem("TranslateApi", "BaiduMonthlyCap", 100, RangeValidator(0, 10000))
+    baiduUrl = ConfigItem("TranslateApi", "BaiduUrl", 'https://aip.baidubce.com')
     appKey = ConfigItem("TranslateApi", "AppKey", 'Your APP_KEY')
     appSecret = ConfigItem("TranslateApi", "AppSecret", 'Your APP_SECRET')
     # openapi
     orgId = ConfigItem("TranslateApi", "OrgId", 'Your OrgId')
     secretKey = ConfigItem("TranslateApi", "SecretKey", 'Your SecretKey')
     openaiUrl = ConfigItem("OpenaiUrl", "OpenaiUrl", 'https://api.openai.com/v1')
+    # 多个OpenAI兼容接口，每项为"接口地址,密钥"，以分号分隔，请求在其间负载均衡；为空时只使用上面的接口地址
+    openaiEndpoints = ConfigItem("OpenaiUrl", "OpenaiEndpoints", '')
     modelName = ConfigItem("ModelName", "ModelName", 'gpt-3.5-turbo')
+    # 级联翻译中离线结果置信度低于此百分比时交由OpenAI重新翻译
+    cascadeThreshold = RangeConfigItem("ModelName", "CascadeThreshold", 60, RangeValidator(0, 100))
+    # 每次对话合并翻译的条数，为1时逐条翻译
+    gptBatchSize = RangeConfigItem("ModelName", "GptBatchSize", 20, RangeValidator(1, 100))
+    # 初始在途的对话请求数(翻译时自动调整)
+    gptConcurrency = RangeConfigItem("ModelName", "GptConcurrency", 2, RangeValidator(1, 16))
+    # OpenAI每月token数上限(万tokens)，达到后暂停翻译，为0时不限
+    gptMonthlyCap = RangeConfigItem("ModelName", "GptMonthlyCap", 0, RangeValidator(0, 10000))
+    # 对话请求超过近期p95耗时仍未返回时再发一份，对冲请求数占普通请求数的百分比上限，为0时关闭
+    gptHedgeBudget = RangeConfigItem("ModelName", "GptHedgeBudget", 0, RangeValidator(0, 50))
 
     activateCode = ConfigItem("Activate", "ActivateCode", 'Your ActivateCode')
     # 游戏版本
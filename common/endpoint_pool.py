@@ -0,0 +1,85 @@
+# coding:utf-8
+import threading
+import time
+
+ENDPOINT_FAILURE_THRESHOLD = 3  # 连续失败多少次后暂停使用该接口
+ENDPOINT_COOLDOWN = 30  # 暂停使用的秒数
+
+
+def parse_endpoints(text: str, default_url: str, default_key: str) -> list:
+    """
+    解析接口列表，每项为"接口地址,密钥"，项之间以分号或换行分隔，省略密钥时使用默认密钥
+    列表为空时只使用默认接口
+    :return list[(接口地址, 密钥)]
+    """
+    endpoints = []
+    for item in text.replace('\n', ';').split(';'):
+        item = item.strip()
+        if not item:
+            continue
+        url, _, key = item.partition(',')
+        endpoints.append((url.strip(), key.strip() or default_key))
+    return endpoints or [(default_url, default_key)]
+
+
+class Endpoint:
+    def __init__(self, url: str, client):
+        self.url = url
+        self.client = client
+        self.outstanding = 0  # 在途请求数
+        self.failures = 0  # 连续失败次数
+        self.down_until = 0  # 暂停使用到此时刻
+
+    def healthy(self, now: float) -> bool:
+        return self.down_until <= now
+
+
+class EndpointPool:
+    """
+    多个OpenAI兼容接口组成的负载均衡池
+    每次选择健康接口中在途请求最少的一个，连续失败的接口暂停使用一段时间
+    """
+
+    def __init__(self, endpoints: list):
+        """
+        :param endpoints list[Endpoint]
+        """
+        self.endpoints = endpoints
+        self.turn = 0  # 在途请求数相同时轮流选择
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.endpoints)
+
+    def acquire(self, exclude: Endpoint = None) -> Endpoint:
+        """
+        :param exclude 尽量避开的接口，对冲请求借此发往另一个接口
+        """
+        with self.lock:
+            now = time.monotonic()
+            candidates = [endpoint for endpoint in self.endpoints if endpoint.healthy(now)] or self.endpoints
+            if len(candidates) > 1 and exclude in candidates:
+                candidates = [endpoint for endpoint in candidates if endpoint is not exclude]
+            start = self.turn % len(candidates)
+            self.turn += 1
+            candidates = candidates[start:] + candidates[:start]
+            endpoint = min(candidates, key=lambda e: (e.outstanding, e.down_until))
+            endpoint.outstanding += 1
+            return endpoint
+
+    def release(self, endpoint: Endpoint, ok: bool = True):
+        with self.lock:
+            endpoint.outstanding -= 1
+            if ok:
+                endpoint.failures = 0
+                endpoint.down_until = 0
+            else:
+                endpoint.failures += 1
+                if endpoint.failures >= ENDPOINT_FAILURE_THRESHOLD:
+                    endpoint.down_until = time.monotonic() + ENDPOINT_COOLDOWN
+
+    def summary(self) -> str:
+        with self.lock:
+            now = time.monotonic()
+            return '，'.join('%s(%s)' % (endpoint.url, '正常' if endpoint.healthy(now) else '暂停')
+                            for endpoint in self.endpoints)
@@ -0,0 +1,230 @@
+# coding:utf-8
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from common.baidu_client import TRANSLATE_ERROR_PREFIX
+from common.config import cfg
+from common.endpoint_pool import parse_endpoints
+from common.flow_control import TokenBucket, AimdLimiter, CircuitBreaker
+
+GPT_BATCH_CHARS = 4000  # 单次对话合并的原文字符上限，避免返回内容过长被截断
+ADAPTIVE_MAX_IN_FLIGHT = 64  # 自适应并发可达到的最大在途请求数
+LOCAL_PLAN_BATCHES = 8  # 离线模型单次请求包含的推理批数，请求内按长度排序后再分批，同一批的文本长度才相近
+
+
+class EngineCapability:
+    """
+    翻译接口声明的能力，调度器据此拆分请求并控制并发
+    """
+
+    def __init__(self, max_batch_rows: int = 1, max_batch_chars: int = 0, max_in_flight: int = 1,
+                 qps: float = 0, streaming: bool = False, adaptive: bool = False, self_paced: bool = False):
+        """
+        :param max_batch_rows 单次请求最多包含的条数
+        :param max_batch_chars 单次请求最多包含的字符数，为0时不限
+        :param max_in_flight 同时在途的请求数
+        :param qps 每秒最多发出的请求数，为0时不限
+        :param streaming 接口能否流式返回结果
+        :param adaptive 是否根据延迟与限流自动调整在途请求数，此时max_in_flight为初始值
+        :param self_paced 为True时调度器不在请求前取令牌，由接口在每次实际发出请求时从scheduler.limiter取令牌
+        """
+        self.max_batch_rows = max(1, max_batch_rows)
+        self.max_batch_chars = max_batch_chars
+        self.max_in_flight = max(1, max_in_flight)
+        self.qps = qps
+        self.streaming = streaming
+        self.adaptive = adaptive
+        self.self_paced = self_paced
+
+
+class EngineSpec:
+    """
+    注册到EngineRegistry中的翻译接口
+    """
+
+    def __init__(self, api: str, name: str, method: str, capability, loader: str = None, local: bool = False):
+        """
+        :param api 配置项translateApi中的取值
+        :param name 界面上显示的名称
+        :param method Translator上的批量翻译方法名，签名为(texts, keys)
+        :param capability 根据当前配置返回EngineCapability的函数
+        :param loader Translator上用于预先加载模型或客户端的方法名
+        :param local 是否为离线模型
+        """
+        self.api = api
+        self.name = name
+        self.method = method
+        self.capability = capability
+        self.loader = loader
+        self.local = local
+
+
+class EngineRegistry:
+    """
+    所有翻译接口及其能力声明，新增接口只需在此注册即可获得相应的分批与并发调度
+    """
+
+    def __init__(self):
+        self.engines = {}
+        self.breakers = {}
+        self.limiters = {}
+        self.lock = threading.Lock()
+
+    def register(self, spec: EngineSpec):
+        self.engines[spec.api] = spec
+
+    def breaker(self, api: str) -> CircuitBreaker:
+        # 同一接口的所有Translator共用一个熔断器
+        with self.lock:
+            if api not in self.breakers:
+                self.breakers[api] = CircuitBreaker()
+            return self.breakers[api]
+
+    def limiter(self, api: str, qps: float):
+        """
+        同一接口的所有Translator共用一个令牌桶，批量翻译、预翻译与备用接口合计不超过账号的QPS上限
+        :return TokenBucket，qps为0时不限速，返回None
+        """
+        if qps <= 0:
+            return None
+        with self.lock:
+            if api not in self.limiters:
+                self.limiters[api] = TokenBucket(qps)
+            self.limiters[api].rate = qps  # 设置中修改的QPS对新的Translator生效
+            return self.limiters[api]
+
+    def get(self, api: str) -> EngineSpec:
+        if api not in self.engines:
+            raise Exception(f'未知的翻译接口：{api}')
+        return self.engines[api]
+
+    def name(self, api: str) -> str:
+        return self.engines[api].name if api in self.engines else api
+
+
+class EngineScheduler:
+    """
+    按接口能力把一批原文拆成单次请求，在并发数与QPS上限内执行，结果按原顺序返回
+    """
+
+    def __init__(self, capability: EngineCapability, report=None, limiter: TokenBucket = None):
+        """
+        :param report 自适应并发数变化时调用，参数为说明文字
+        :param limiter 该接口共用的令牌桶，由engine_registry.limiter取得，为None时不限速
+        """
+        self.capability = capability
+        self.limiter = limiter
+        self.aimd = None
+        max_workers = capability.max_in_flight
+        if capability.adaptive:
+            max_workers = min(capability.max_in_flight * 4, ADAPTIVE_MAX_IN_FLIGHT)
+            self.aimd = AimdLimiter(capability.max_in_flight, max_workers, report)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers) if max_workers > 1 else None
+
+    def in_flight(self) -> int:
+        return self.aimd.current() if self.aimd else self.capability.max_in_flight
+
+    def throttled(self):
+        if self.aimd:
+            self.aimd.throttled()
+
+    def plan(self, texts: list) -> list:
+        """
+        依次装填，每个请求不超过条数与字符数上限，超长的单条文本独占一个请求
+        :return list[list[原文下标]]
+        """
+        requests_ = []
+        current = []
+        size = 0
+        for i, text_ in enumerate(texts):
+            length = len(text_) + 1
+            if current and (len(current) >= self.capability.max_batch_rows or
+                            0 < self.capability.max_batch_chars < size + length):
+                requests_.append(current)
+                current = []
+                size = 0
+            current.append(i)
+            size += length
+        if current:
+            requests_.append(current)
+        return requests_
+
+    def chunks(self, texts: list):
+        """
+        将原文分成若干块，每块恰好能让当前所有在途请求满载，供翻译线程逐块翻译并更新进度
+        :return 逐块产出list[原文下标]
+        """
+        requests_ = self.plan(texts)
+        start = 0
+        while start < len(requests_):
+            step = self.in_flight()
+            yield sum(requests_[start:start + step], [])
+            start += step
+
+    def chunk_size(self) -> int:
+        return self.capability.max_batch_rows * self.in_flight()
+
+    def run(self, request, texts: list, keys: list = None) -> list:
+        """
+        :param request 翻译单个请求的函数，签名为(texts, keys)，返回与之对应的译文列表
+        :return 译文列表，与原文一一对应
+        """
+        def call(indices: list):
+            if self.aimd:
+                self.aimd.acquire()
+            if self.limiter and not self.capability.self_paced:
+                self.limiter.acquire()
+            t0 = time.perf_counter()
+            ok = False
+            try:
+                outputs_ = request([texts[i] for i in indices], [keys[i] for i in indices] if keys else None)
+                # 接口把失败写进译文而不抛出异常时，整个请求都失败也应让并发数收缩
+                ok = not all(output.startswith(TRANSLATE_ERROR_PREFIX) for output in outputs_)
+                return outputs_
+            finally:
+                if self.aimd:
+                    self.aimd.release((time.perf_counter() - t0) / len(indices), ok)
+
+        requests_ = self.plan(texts)
+        if self.executor and len(requests_) > 1:
+            outputs = self.executor.map(call, requests_)
+        else:
+            outputs = map(call, requests_)
+        results = [''] * len(texts)
+        for indices, request_outputs in zip(requests_, outputs):
+            for i, output in zip(indices, request_outputs):
+                results[i] = output
+        return results
+
+
+def baidu_capability() -> EngineCapability:
+    pack_chars = cfg.get(cfg.baiduPackChars)
+    return EngineCapability(max_batch_rows=64 if pack_chars > 0 else 1, max_batch_chars=pack_chars,
+                            max_in_flight=cfg.get(cfg.baiduConcurrency), qps=cfg.get(cfg.baiduQps),
+                            adaptive=True, self_paced=True)
+
+
+def local_capability() -> EngineCapability:
+    return EngineCapability(max_batch_rows=cfg.get(cfg.localBatchSize) * LOCAL_PLAN_BATCHES)
+
+
+def gpt_capability() -> EngineCapability:
+    # 并发数按接口个数放大，增加接口即可线性提升吞吐量
+    endpoints = parse_endpoints(cfg.get(cfg.openaiEndpoints), cfg.get(cfg.openaiUrl), cfg.get(cfg.secretKey))
+    return EngineCapability(max_batch_rows=cfg.get(cfg.gptBatchSize), max_batch_chars=GPT_BATCH_CHARS,
+                            max_in_flight=cfg.get(cfg.gptConcurrency) * len(endpoints), streaming=True,
+                            adaptive=True)
+
+
+engine_registry = EngineRegistry()
+engine_registry.register(EngineSpec('0', '百度翻译', 'baidu_batch_translate', baidu_capability,
+                                    loader='init_baidu_client'))
+engine_registry.register(EngineSpec('1', '离线翻译', 'local_batch_translate', local_capability,
+                                    loader='init_local_model', local=True))
+engine_registry.register(EngineSpec('2', 'ChatGPT', 'gpt_batch_translate', gpt_capability,
+                                    loader='init_openai_model'))
+engine_registry.register(EngineSpec('3', '离线翻译(int8加速)', 'ct2_batch_translate', local_capability,
+                                    loader='init_ct2_model', local=True))
+engine_registry.register(EngineSpec('4', '离线+OpenAI级联', 'cascade_batch_translate', local_capability,
+                                    loader='init_local_model', local=True))
@@ -0,0 +1,113 @@
+# coding:utf-8
+import json
+import os
+import threading
+import time
+
+import openai
+import requests
+from openai import OpenAI
+from requests.adapters import HTTPAdapter
+
+from common.config import cfg
+from common.endpoint_pool import EndpointPool, Endpoint
+from common.flow_control import ThrottledError
+
+AUTH_ERROR_CODES = [110, 111]  # 百度access token无效或已过期
+THROTTLE_ERROR_CODES = [4, 18]  # 百度请求总量或QPS超限
+# 可以重试的错误
+RETRYABLE_ERRORS = (requests.ConnectionError, requests.Timeout, ThrottledError, openai.APIConnectionError,
+                    openai.RateLimitError, openai.InternalServerError)
+TIMEOUT_ERRORS = (requests.Timeout, openai.APITimeoutError, TimeoutError)
+# 接口限流
+THROTTLE_ERRORS = (ThrottledError, openai.RateLimitError)
+
+
+class EngineSession:
+    """
+    远程翻译接口共享的会话层
+    所有Translator复用同一组长连接，百度OAuth token连同过期时间持久化在工作目录的.mplt下
+    """
+
+    def __init__(self):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=32)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.openai_clients = {}
+        self.openai_pools = {}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def token_file_path():
+        return f"{cfg.get(cfg.workFolder)}/.mplt/token.json"
+
+    def load_tokens(self) -> dict:
+        path = self.token_file_path()
+        if not os.path.exists(path):
+            return {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except ValueError:
+            return {}
+
+    def save_tokens(self, tokens: dict):
+        path = self.token_file_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(tokens, f, indent=1, ensure_ascii=False)
+
+    def get_baidu_token(self, oauth_url: str, app_key: str, app_secret: str, stale: str = None) -> str:
+        """
+        获取百度access token，仅在过期或调用方报告鉴权失败时重新请求
+        :param stale 调用方鉴权失败时使用的token，若缓存已被其它线程刷新则直接返回新token
+        """
+        with self.lock:
+            tokens = self.load_tokens()
+            cached = tokens.get(app_key)
+            if cached and cached['expires_at'] > time.time() + 60 and cached['access_token'] != stale:
+                return cached['access_token']
+            params = {
+                "grant_type": "client_credentials",
+                "client_id": app_key,
+                "client_secret": app_secret
+            }
+            response = self.session.get(oauth_url, params=params, timeout=3)
+            result = response.json()
+            tokens[app_key] = {
+                'access_token': result["access_token"],
+                'expires_at': time.time() + result.get("expires_in", 2592000)
+            }
+            self.save_tokens(tokens)
+            return result["access_token"]
+
+    def get_openai_client(self, base_url: str, organization: str, api_key: str) -> OpenAI:
+        # 相同配置共用一个客户端，从而复用其连接池
+        key = (base_url, organization, api_key)
+        with self.lock:
+            if key not in self.openai_clients:
+                self.openai_clients[key] = OpenAI(
+                    base_url=base_url,
+                    organization=organization,
+                    timeout=cfg.get(cfg.requestTimeout),
+                    max_retries=0,  # 由RetryPolicy统一重试
+                    api_key=api_key
+                )
+            return self.openai_clients[key]
+
+    def get_openai_pool(self, endpoints: list, organization: str) -> EndpointPool:
+        """
+        相同的接口列表共用一个负载均衡池，使各处请求的在途数与健康状态合并统计
+        :param endpoints list[(接口地址, 密钥)]
+        """
+        key = (tuple(endpoints), organization)
+        clients = [self.get_openai_client(url, organization, api_key) for url, api_key in endpoints]
+        with self.lock:
+            if key not in self.openai_pools:
+                self.openai_pools[key] = EndpointPool([Endpoint(url, client)
+                                                       for (url, _), client in zip(endpoints, clients)])
+            return self.openai_pools[key]
+
+
+engine_session = EngineSession()
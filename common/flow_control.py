@@ -0,0 +1,264 @@
+# coding:utf-8
+import math
+import random
+import threading
+import time
+from collections import deque
+
+AIMD_SLOW_FACTOR = 2  # 单条耗时超过滑动平均的倍数时视为变慢，不再提高并发
+AIMD_COOLDOWN = 1  # 两次减半之间的最短秒数
+HEDGE_MIN_SAMPLES = 20  # 积累足够的耗时样本后才开始对冲
+HEDGE_WORKERS = 64  # 对冲请求与原请求并行执行所用的线程数
+
+
+class TokenBucket:
+    """
+    令牌桶限速器
+    rate为每秒发放的令牌数(即QPS)，capacity为允许的突发请求数
+    """
+
+    def __init__(self, rate: float, capacity: float = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        # 阻塞直到拿到一个令牌
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class ThrottledError(Exception):
+    """ 接口返回限流错误 """
+
+
+class RetryPolicy:
+    """
+    有限次重试
+    退避时间按指数增长并加入随机抖动，避免同时失败的请求同时重试
+    """
+
+    def __init__(self, max_retries: int = 3, base_delay: float = 0.5, max_delay: float = 8,
+                 retry_on: tuple = (Exception,), on_error=None):
+        """
+        :param on_error 每次捕获到可重试错误时调用，参数为该错误
+        """
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_on = retry_on
+        self.on_error = on_error
+
+    def call(self, func, *args, **kwargs):
+        attempt = 0
+        while True:
+            try:
+                return func(*args, **kwargs)
+            except self.retry_on as e:
+                if self.on_error:
+                    self.on_error(e)
+                if attempt >= self.max_retries:
+                    raise
+                time.sleep(random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt)))
+                attempt += 1
+
+
+class AimdLimiter:
+    """
+    加性增、乘性减的并发控制
+    请求延迟正常时每完成约一轮请求把在途上限加1，遇到限流时减半
+    """
+
+    def __init__(self, initial: int, ceiling: int, report=None):
+        """
+        :param initial 初始在途上限
+        :param ceiling 在途上限的最大值
+        :param report 在途上限变化时调用，参数为说明文字
+        """
+        self.limit = float(initial)
+        self.ceiling = max(initial, ceiling)
+        self.in_flight = 0
+        self.baseline = None  # 单条耗时的滑动平均
+        self.decreased_at = 0
+        self.report = report or (lambda info: None)
+        self.cond = threading.Condition()
+
+    def current(self) -> int:
+        return int(self.limit)
+
+    def acquire(self):
+        with self.cond:
+            while self.in_flight >= int(self.limit):
+                self.cond.wait()
+            self.in_flight += 1
+
+    def release(self, seconds: float, ok: bool = True):
+        """
+        :param seconds 该请求平均每条的耗时
+        :param ok 请求是否成功，失败时不提高上限
+        """
+        info = None
+        with self.cond:
+            self.in_flight -= 1
+            if ok:
+                healthy = self.baseline is None or seconds <= self.baseline * AIMD_SLOW_FACTOR
+                self.baseline = seconds if self.baseline is None else self.baseline * 0.9 + seconds * 0.1
+                if healthy and self.limit < self.ceiling:
+                    before = int(self.limit)
+                    self.limit = min(self.ceiling, self.limit + 1 / self.limit)
+                    if int(self.limit) > before:
+                        info = '并发数提升至%d' % int(self.limit)
+            self.cond.notify_all()
+        if info:
+            self.report(info)
+
+    def throttled(self):
+        # 同时在途的请求往往一起被限流，冷却时间内只减半一次
+        with self.cond:
+            now = time.monotonic()
+            if now - self.decreased_at < AIMD_COOLDOWN:
+                return
+            self.decreased_at = now
+            self.limit = max(1.0, self.limit / 2)
+            info = '接口限流，并发数降至%d' % int(self.limit)
+        self.report(info)
+
+
+class CircuitBreaker:
+    """
+    熔断器
+    连续失败达到阈值后断开，期间请求直接交给备用接口；冷却时间过后放行一个探测请求，成功则恢复
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 60):
+        """
+        :param failure_threshold 连续失败多少次后断开
+        :param reset_timeout 断开多少秒后放行探测请求
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0
+        self.lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """
+        :return 本次请求能否发往主接口
+        """
+        with self.lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN  # 只放行一个探测请求
+                return True
+            return False
+
+    def success(self) -> bool:
+        """
+        :return 是否由此恢复
+        """
+        with self.lock:
+            recovered = self.state != self.CLOSED
+            self.state = self.CLOSED
+            self.failures = 0
+            return recovered
+
+    def cancel(self):
+        # 请求因与接口无关的原因中止，探测请求作废，下次请求重新探测
+        with self.lock:
+            if self.state == self.HALF_OPEN:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic() - self.reset_timeout
+
+    def failure(self) -> bool:
+        """
+        :return 是否由此断开
+        """
+        with self.lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or \
+                    (self.state == self.CLOSED and self.failures >= self.failure_threshold):
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+
+class HedgeBudget:
+    """
+    对冲请求的预算，对冲请求数不超过普通请求数的一定比例
+    """
+
+    def __init__(self, ratio: float):
+        self.ratio = ratio
+        self.requests = 0
+        self.hedges = 0
+        self.lock = threading.Lock()
+
+    def record_request(self):
+        with self.lock:
+            self.requests += 1
+
+    def try_hedge(self) -> bool:
+        with self.lock:
+            if self.hedges + 1 > self.requests * self.ratio:
+                return False
+            self.hedges += 1
+            return True
+
+
+class LatencyRecorder:
+    """
+    记录最近若干次接口调用的耗时
+    """
+
+    def __init__(self, size: int = 1000):
+        self.records = deque(maxlen=size)  # (接口, 条数, 耗时, 是否成功)
+        self.lock = threading.Lock()
+
+    def record(self, engine: str, count: int, seconds: float, ok: bool = True):
+        with self.lock:
+            self.records.append((engine, count, seconds, ok))
+
+    @staticmethod
+    def similar(count: int, rows: int) -> bool:
+        # 条数按2的幂分档，同一档内的请求耗时相近
+        return rows is None or count.bit_length() == rows.bit_length()
+
+    def samples(self, rows: int = None) -> int:
+        """
+        :param rows 只统计条数与之相近的请求，为None时统计全部
+        """
+        with self.lock:
+            return sum(1 for record in self.records if record[3] and self.similar(record[1], rows))
+
+    def percentile(self, p: float, rows: int = None) -> float:
+        """
+        :param rows 只统计条数与之相近的请求，为None时统计全部
+        """
+        with self.lock:
+            values = sorted(record[2] for record in self.records if record[3] and self.similar(record[1], rows))
+        if not values:
+            return 0.0
+        return values[min(len(values) - 1, max(0, math.ceil(p / 100 * len(values)) - 1))]
+
+    def summary(self) -> str:
+        with self.lock:
+            calls = len(self.records)
+            failed = sum(1 for record in self.records if not record[3])
+        return '接口调用%d次(失败%d次)，耗时p50:%.2fs p95:%.2fs' % (
+            calls, failed, self.percentile(50), self.percentile(95))
@@ -0,0 +1,80 @@
+# coding:utf-8
+import os
+import threading
+
+from transformers import MarianTokenizer, MarianMTModel
+
+LOCAL_MODEL_PATH = "./models/minecraft-en-zh"
+CT2_MODEL_PATH = "./models/minecraft-en-zh-ct2-int8"  # 由LOCAL_MODEL_PATH转换得到的int8模型
+MAX_DECODE_LENGTH = 128
+# 离线模型解码预设：束搜索宽度，生成长度相对原文token数的倍数(为0时固定为MAX_DECODE_LENGTH)
+DECODE_PRESETS = {
+    '0': {'num_beams': 1, 'length_ratio': 1.5},  # 快速，适合批量预翻译
+    '1': {'num_beams': 2, 'length_ratio': 2},  # 均衡
+    '2': {'num_beams': 4, 'length_ratio': 0},  # 质量，适合最终润色前的翻译
+}
+
+
+class ModelRegistry:
+    """
+    进程内共享的离线模型
+    每个模型只从磁盘加载一次，所有Translator共用，可在软件启动时于后台预加载
+    """
+
+    def __init__(self):
+        self.models = {}
+        self.intra_threads = 0  # CTranslate2每次推理使用的线程数，为0时由其自行决定
+        self.load_error = None  # 后台预加载失败的原因
+        self.lock = threading.Lock()
+
+    def get_marian(self, path: str = LOCAL_MODEL_PATH):
+        """
+        :return tuple(MarianMTModel, MarianTokenizer)
+        """
+        with self.lock:
+            if path not in self.models:
+                tokenizer = MarianTokenizer.from_pretrained(path)
+                # safetensors权重以内存映射方式读取，low_cpu_mem_usage避免先初始化再拷贝一遍权重
+                model = MarianMTModel.from_pretrained(path, low_cpu_mem_usage=True)
+                model.eval()
+                self.models[path] = (model, tokenizer)
+            return self.models[path]
+
+    def get_ct2(self, path: str = CT2_MODEL_PATH, source_path: str = LOCAL_MODEL_PATH):
+        """
+        加载CTranslate2 int8模型，首次使用时由离线模型转换生成
+        :return tuple(ctranslate2.Translator, MarianTokenizer)
+        """
+        try:
+            import ctranslate2
+        except ImportError:
+            raise Exception('未安装ctranslate2，无法使用离线翻译(int8加速)')
+        with self.lock:
+            if path not in self.models:
+                if not os.path.exists(path):
+                    converter = ctranslate2.converters.TransformersConverter(source_path)
+                    converter.convert(path, quantization='int8')
+                translator = ctranslate2.Translator(path, device='cpu', compute_type='int8',
+                                                  intra_threads=self.intra_threads)
+                self.models[path] = (translator, MarianTokenizer.from_pretrained(source_path))
+            return self.models[path]
+
+    def load(self, api: str):
+        if api in ['1', '4']:
+            self.get_marian()
+        elif api == '3':
+            self.get_ct2()
+
+    def warm_up(self, api: str):
+        # 后台预加载所选离线模型，出错时只记录原因，实际使用时会重新加载并向用户报告错误
+        def target():
+            try:
+                self.load(api)
+                self.load_error = None
+            except Exception as e:
+                self.load_error = e
+
+        threading.Thread(target=target, daemon=True).start()
+
+
+model_registry = ModelRegistry()
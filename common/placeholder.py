@@ -0,0 +1,89 @@
+# coding:utf-8
+import re
+
+MAGIC_WORD = r'{xdawned}'  # 旧版不带编号的占位符，仅供基准测试还原旧流程
+PLACEHOLDER = '{x%d}'  # 带编号的占位符，译文中顺序调换后仍能按编号还原
+PLACEHOLDER_EXAMPLE = PLACEHOLDER % 0
+PLACEHOLDER_PATTERN = re.compile(r'\{\s*x\s*(\d+)\s*}', re.IGNORECASE)
+BARE_ARG_PATTERN = re.compile(r'%[sdf]')  # 不带序号、按出现顺序取参数的格式化占位符
+COLOR_PATTERN = re.compile(r'[&§](?:#[0-9a-fA-F]{6}|[0-9a-fk-or])')
+
+# 所有需要保护的片段合并为一个正则，一次扫描完成替换
+PROTECTED_PATTERN = re.compile(
+    r'(?=[h#\\&§%{])(?:'  # 先按首字符快速筛选位置
+    r'(?P<url>https?://[^\s"\'<>]*[^\s"\'<>.,;:!?)])'  # 网址，不含句末的标点
+    r'|(?P<ref>#\w+:\w+\b)'  # 物品、标签引用 #mod:item
+    r'|(?P<escape>\\\\&)'  # 转义后的&
+    r'|(?P<color>[&§](?:#[0-9a-fA-F]{6}|[0-9a-fk-or]))'  # 彩色字符
+    # 格式化占位符 %s %1$s %.2f {0}，不带参数序号、标志、宽度或精度时只认%s %d %f %%，以免误伤"100%off"之类的文字
+    r'|(?P<format>%(?:(?=[-\d#+,(.])(?:\d+\$)?[-#+0,(]*\d*(?:\.\d+)?[sdfxXcboeEgGn]|[sdf%])|\{\d+})'
+    r')'
+)
+
+
+class PlaceholderMasker:
+    """
+    占位符保护
+    翻译前将受保护的片段依次替换为{x0}、{x1}...，翻译后按编号还原
+    中英文语序不同，"%1$s of %2$s"之类的参数在译文中常会调换位置，按编号还原才不会互换
+    """
+
+    def __init__(self, protect_color: bool = True):
+        """
+        :param protect_color 是否保护彩色字符，离线模型认识彩色字符时可以不保护
+        """
+        self.protect_color = protect_color
+
+    def mask(self, text_: str):
+        """
+        :return tuple(替换后的文本, list[(类型, 原片段)])
+        """
+        spans = []
+
+        def replace(m: re.Match):
+            if m.lastgroup == 'color' and not self.protect_color:
+                return m.group(0)
+            spans.append((m.lastgroup, m.group(0)))
+            return PLACEHOLDER % (len(spans) - 1)
+
+        return PROTECTED_PATTERN.sub(replace, text_), spans
+
+    @staticmethod
+    def unmask(text_: str, spans: list) -> str:
+        """
+        按编号还原占位符，重复或编号无效的占位符删除，缺少的片段按原顺序补在末尾
+        """
+        if not spans:
+            return text_
+        # 不带序号的%s按出现顺序取参数，译文中顺序调换时补上原来的序号，参数才不会互换
+        bare = [n for n, span in enumerate(spans) if span[0] == 'format' and BARE_ARG_PATTERN.fullmatch(span[1])]
+        order = []
+        for m in PLACEHOLDER_PATTERN.finditer(text_):
+            n = int(m.group(1))
+            if n in bare and n not in order:
+                order.append(n)
+        order += [n for n in bare if n not in order]  # 缺少的补在末尾
+        reordered = order != bare
+
+        def restore(n: int) -> str:
+            if reordered and n in bare:
+                return '%%%d$%s' % (bare.index(n) + 1, spans[n][1][1])
+            return spans[n][1]
+
+        restored = set()
+
+        def replace(m: re.Match):
+            n = int(m.group(1))
+            if n >= len(spans) or n in restored:
+                return ''
+            restored.add(n)
+            return restore(n)
+
+        text_ = PLACEHOLDER_PATTERN.sub(replace, text_)
+        return text_ + ''.join(restore(n) for n in range(len(spans)) if n not in restored)
+
+    def mask_batch(self, texts: list) -> list:
+        return [self.mask(text_) for text_ in texts]
+
+    def unmask_batch(self, texts: list, spans_list: list) -> list:
+        return [self.unmask(text_, spans) for text_, spans in zip(texts, spans_list)]
@@ -0,0 +1,80 @@
+# coding:utf-8
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+worker_translator = None  # 子进程中各自持有的Translator
+
+
+def init_worker(api: str, threads: int):
+    """
+    子进程初始化：限制torch与CTranslate2的线程数并加载模型
+    """
+    import torch
+    torch.set_num_threads(threads)
+    torch.set_num_interop_threads(1)
+    from common.model_registry import model_registry
+    model_registry.intra_threads = threads
+    from common.util import Translator
+    global worker_translator
+    worker_translator = Translator('en', 'zh', '', '', api=api)
+
+
+def translate_shard(texts: list, keys: list, preset: str, batch_size: int) -> list:
+    """
+    子进程只在启动时读取一次配置文件，解码预设与推理批大小由主进程随每个分片传入，修改设置后立即生效
+    """
+    from common.config import cfg
+    cfg.set(cfg.localBatchSize, batch_size, save=False)
+    worker_translator.decode_preset = preset
+    return worker_translator.engine_batch_translate(texts, keys)
+
+
+class ShardedTranslator:
+    """
+    多进程离线翻译
+    将待翻译文本切分到多个进程，每个进程各自加载一份模型，适合核心数较多的机器
+    """
+
+    def __init__(self, api: str, workers: int):
+        self.api = api
+        self.workers = workers
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        self.executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                           initializer=init_worker, initargs=(api, threads))
+
+    def translate_stream(self, texts: list, keys: list, shard_size: int, preset: str, batch_size: int):
+        """
+        按shard_size切分后提交到进程池，哪个分片先完成就先返回哪个
+        :param preset 解码预设，与主进程写入翻译记忆库时使用的预设一致
+        :param batch_size 每批送入模型的条数
+        :return 生成器，每次产出(分片起始下标, 分片译文列表)
+        """
+        futures = {}
+        for start in range(0, len(texts), shard_size):
+            future = self.executor.submit(translate_shard, texts[start:start + shard_size],
+                                          keys[start:start + shard_size], preset, batch_size)
+            futures[future] = start
+        try:
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+        finally:
+            # 调用方提前停止迭代时取消尚未开始的分片，进程池可供下次翻译继续使用
+            for future in futures:
+                future.cancel()
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+sharded_translator = None
+
+
+def get_sharded_translator(api: str, workers: int) -> ShardedTranslator:
+    # 进程池在多次翻译之间复用，避免每次重新加载模型
+    global sharded_translator
+    if sharded_translator is None or (sharded_translator.api, sharded_translator.workers) != (api, workers):
+        if sharded_translator is not None:
+            sharded_translator.shutdown()
+        sharded_translator = ShardedTranslator(api, workers)
+    return sharded_translator
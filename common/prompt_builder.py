@@ -0,0 +1,100 @@
+# coding:utf-8
+import json
+import re
+
+from common.placeholder import PLACEHOLDER_EXAMPLE
+
+# 固定不变的指令放在第一条系统消息中，所有请求前缀一致
+# 注意：OpenAI只缓存1024 tokens以上的相同前缀，这段指令约100 tokens，目前达不到缓存门槛，
+# 节省主要来自精简的指令与条目格式；日后加入示例等内容使前缀超过门槛后即可命中缓存
+SYSTEM_PROMPT = (
+    "Translate Minecraft mod text from English into Simplified Chinese.\n"
+    f"Keep every placeholder like {PLACEHOLDER_EXAMPLE} unchanged, it may move to fit the word order.\n"
+    "A system message starting with \"Glossary:\" may follow; it lists english=chinese terms separated by "
+    "\"; \", use them when they fit the context. The user message is the input, translate all of it.\n"
+    "If the input is a JSON array of {\"k\",\"t\"} objects, reply with only a JSON array of the same \"k\" "
+    "and the translated \"t\". Otherwise reply with only the translated text."
+)
+GLOSSARY_PREFIX = 'Glossary: '
+TERMS_PER_TEXT = 5
+
+
+class PromptBuilder:
+    """
+    生成尽量少token的对话消息
+    只附带以完整单词出现的术语，批量翻译时术语与相同原文在各条之间去重，条目以下标代替键
+    术语表单独作为一条系统消息放在固定指令之后，原文本身以"Glossary:"开头时也不会被误认为术语表
+    """
+
+    def __init__(self, aca):
+        """
+        :param aca 术语AC自动机
+        """
+        self.aca = aca
+
+    def terms(self, texts: list) -> list:
+        """
+        :return list[(英文术语, 中文术语)]，按首次出现的顺序去重
+        """
+        terms = []
+        for text_ in texts:
+            kept_spans = []
+            for end, (term, trans) in self.aca.find(text_, whole_word=True, limit=0):
+                start = end - len(term) + 1
+                # 已被更长的术语覆盖的短术语不再重复附带
+                if any(s <= start and end <= e for s, e in kept_spans):
+                    continue
+                kept_spans.append((start, end))
+                if (term, trans) not in terms:
+                    terms.append((term, trans))
+                if len(kept_spans) >= TERMS_PER_TEXT:
+                    break
+        return terms
+
+    @staticmethod
+    def messages(terms: list, content: str) -> list:
+        messages = [{"role": "system", "content": SYSTEM_PROMPT}]
+        if terms:
+            messages.append({"role": "system",
+                             "content": GLOSSARY_PREFIX + '; '.join(f'{term}={trans}' for term, trans in terms)})
+        messages.append({"role": "user", "content": content})
+        return messages
+
+    def single_messages(self, text_: str) -> list:
+        return self.messages(self.terms([text_]), text_)
+
+    def batch_messages(self, texts: list):
+        """
+        :return tuple(消息列表, 每条原文对应的下标)，相同原文共用一个下标
+        """
+        ids = {}
+        for text_ in texts:
+            ids.setdefault(text_, len(ids))
+        items = [{"k": i, "t": text_} for text_, i in ids.items()]
+        content = json.dumps(items, ensure_ascii=False, separators=(',', ':'))
+        return self.messages(self.terms(list(ids)), content), [ids[text_] for text_ in texts]
+
+    @staticmethod
+    def parse_batch_response(content: str) -> dict:
+        """
+        解析模型返回的JSON数组，格式不对时返回空字典
+        :return dict{下标: 译文}
+        """
+        content = content.strip()
+        fence = re.match(r'^```(?:json)?\s*(.*?)\s*```$', content, re.S)
+        if fence:
+            content = fence.group(1)
+        try:
+            result = json.loads(content)
+        except ValueError:
+            return {}
+        if not isinstance(result, list):
+            return {}
+        parsed = {}
+        for item in result:
+            if isinstance(item, dict) and isinstance(item.get('t'), str):
+                try:
+                    parsed[int(item.get('k'))] = item['t']
+                except (TypeError, ValueError):
+                    continue
+        return parsed
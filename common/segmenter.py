@@ -0,0 +1,63 @@
+# coding:utf-8
+import re
+
+SEGMENT_MIN_CHARS = 150  # 短于此长度的文本不切分
+# 句末标点后的空白或换行处切分，彩色字符与占位符中不含空白，切分后保持完整
+SEPARATOR_PATTERN = re.compile(r'(\s*\n\s*|(?<=[.!?])\s+)')
+
+
+def split_sentences(text_: str):
+    """
+    :return tuple(句子列表, 句子之间的分隔符列表)
+    """
+    parts = SEPARATOR_PATTERN.split(text_)
+    sentences = parts[0::2]
+    separators = parts[1::2]
+    # 去掉空句子，其分隔符并入前一个分隔符
+    res_sentences = []
+    res_separators = []
+    pending = ''
+    for i, sentence in enumerate(sentences):
+        if i > 0:
+            pending += separators[i - 1]
+        if not sentence.strip():
+            continue
+        if res_sentences:
+            res_separators.append(pending)
+        pending = ''
+        res_sentences.append(sentence)
+    return res_sentences, res_separators
+
+
+def join_sentences(sentences: list, separators: list) -> str:
+    # 中文句子之间不需要空格，只保留换行
+    res = sentences[0] if sentences else ''
+    for separator, sentence in zip(separators, sentences[1:]):
+        res += '\n' * separator.count('\n') + sentence
+    return res
+
+
+def segment_batch(texts: list, min_chars: int = SEGMENT_MIN_CHARS):
+    """
+    将较长的文本切分为句子，所有句子平铺为一个列表以便整批翻译
+    :return tuple(句子列表, 每条文本的(起始下标, 句子数, 分隔符列表))
+    """
+    segments = []
+    layout = []
+    for text_ in texts:
+        if len(text_) < min_chars:
+            sentences, separators = [text_], []
+        else:
+            sentences, separators = split_sentences(text_)
+            if not sentences:
+                sentences, separators = [text_], []
+        layout.append((len(segments), len(sentences), separators))
+        segments.extend(sentences)
+    return segments, layout
+
+
+def stitch_batch(outputs: list, layout: list) -> list:
+    """
+    按segment_batch返回的布局将句子译文拼回每条文本
+    """
+    return [join_sentences(outputs[start:start + count], separators) for start, count, separators in layout]
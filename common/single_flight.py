@@ -0,0 +1,55 @@
+# coding:utf-8
+import threading
+from concurrent.futures import Future
+
+SINGLE_FLIGHT_TIMEOUT = 120  # 等待其它请求结果的最长秒数，超时后自行翻译
+
+
+class SingleFlight:
+    """
+    进程内的请求合并
+    批量翻译、预翻译与翻译建议可能同时请求同一条原文，只有最先发起的一方调用接口，其余等待其结果
+    """
+
+    def __init__(self):
+        self.calls = {}
+        self.lock = threading.Lock()
+
+    def claim(self, keys: list):
+        """
+        :param keys 请求的键列表，同一键在途时不再重复发起
+        :return tuple(需由调用方翻译的下标列表, list[(下标, 等待结果的Future)])
+        """
+        owned = []
+        shared = []
+        with self.lock:
+            for i, key in enumerate(keys):
+                if key in self.calls:
+                    shared.append((i, self.calls[key]))
+                else:
+                    self.calls[key] = Future()
+                    owned.append(i)
+        return owned, shared
+
+    def publish(self, keys: list, results: list):
+        with self.lock:
+            futures = [self.calls.pop(key, None) for key in keys]
+        for future, result in zip(futures, results):
+            if future:
+                future.set_result(result)
+
+    def forget(self, key, future: Future):
+        # 发起方被终止时结果永远不会发布，移除以免后续请求继续等待
+        with self.lock:
+            if self.calls.get(key) is future:
+                del self.calls[key]
+
+    def fail(self, keys: list, error: Exception):
+        with self.lock:
+            futures = [self.calls.pop(key, None) for key in keys]
+        for future in futures:
+            if future:
+                future.set_exception(error)
+
+
+single_flight = SingleFlight()
@@ -0,0 +1,68 @@
+# coding:utf-8
+import os
+import sqlite3
+import threading
+
+from common.config import cfg
+
+
+def normalize(text_: str) -> str:
+    # 忽略首尾及连续空白的差异
+    return ' '.join(text_.split())
+
+
+class TranslationMemory:
+    """
+    全局翻译记忆库，以(接口, 模型, 规范化原文)为键保存机翻结果
+    与Lang的单文件缓存不同，同一原文在所有文件间共享
+    """
+
+    def __init__(self):
+        self.db_path = ''
+        self.conn = None
+        self.lock = threading.Lock()
+
+    def connect(self):
+        # 工作目录可能在运行中被修改，按需重新连接
+        db_path = f"{cfg.get(cfg.workFolder)}/.mplt/memory.db"
+        if self.conn is not None and db_path == self.db_path:
+            return
+        if self.conn is not None:
+            self.conn.close()
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS memory (engine TEXT, model TEXT, source TEXT, trans TEXT, "
+                          "PRIMARY KEY (engine, model, source))")
+        self.conn.commit()
+
+    def get_many(self, engine: str, model: str, texts: list) -> dict:
+        """
+        :return dict{规范化原文: 译文}，只包含命中的条目
+        """
+        sources = list({normalize(text_) for text_ in texts})
+        res = {}
+        with self.lock:
+            self.connect()
+            for start in range(0, len(sources), 500):
+                chunk = sources[start:start + 500]
+                rows = self.conn.execute(
+                    "SELECT source, trans FROM memory WHERE engine = ? AND model = ? AND source IN (%s)"
+                    % ','.join('?' * len(chunk)), [engine, model] + chunk)
+                res.update(rows.fetchall())
+        return res
+
+    def put_many(self, engine: str, model: str, pairs: list):
+        """
+        :param pairs list[(原文, 译文)]
+        """
+        if not pairs:
+            return
+        with self.lock:
+            self.connect()
+            self.conn.executemany("INSERT OR REPLACE INTO memory VALUES (?, ?, ?, ?)",
+                                  [(engine, model, normalize(text_), trans) for text_, trans in pairs])
+            self.conn.commit()
+
+
+translation_memory = TranslationMemory()
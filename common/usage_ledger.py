@@ -0,0 +1,150 @@
+# coding:utf-8
+import json
+import math
+import os
+import threading
+import time
+
+from common.config import cfg
+
+USAGE_FIELDS = ['chars', 'tokens', 'requests', 'errors']
+KEEP_DAYS = 62  # 按日统计只保留最近两个月
+CHARS_PER_TOKEN = 4  # 粗略估算token数
+PROMPT_TOKENS = 150  # OpenAI每次对话中提示词固定部分的token数
+
+
+class BudgetExceededError(Exception):
+    """ 接口用量即将超过设置的上限 """
+
+
+def estimate_tokens(chars: int) -> int:
+    return math.ceil(chars / CHARS_PER_TOKEN)
+
+
+class UsageLedger:
+    """
+    各翻译接口的用量台账，按日与按月累计字符数、token数、请求数与错误数
+    持久化在工作目录的.mplt下，在超过百度免费额度或OpenAI消费上限之前暂停翻译
+    """
+
+    def __init__(self):
+        self.data = None
+        self.dirty = False
+        self.saved_at = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def ledger_file_path():
+        return f"{cfg.get(cfg.workFolder)}/.mplt/usage.json"
+
+    @staticmethod
+    def periods():
+        now = time.localtime()
+        return time.strftime('%Y-%m-%d', now), time.strftime('%Y-%m', now)
+
+    def load(self) -> dict:
+        if self.data is None:
+            path = self.ledger_file_path()
+            self.data = {}
+            if os.path.exists(path):
+                try:
+                    with open(path, 'r', encoding='utf-8') as f:
+                        self.data = json.load(f)
+                except ValueError:
+                    pass
+        return self.data
+
+    def save(self):
+        path = self.ledger_file_path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f, indent=1, ensure_ascii=False)
+        self.dirty = False
+        self.saved_at = time.monotonic()
+
+    def record(self, api: str, chars: int = 0, tokens: int = 0, requests: int = 1, errors: int = 0):
+        """
+        记入一次接口调用，每隔几秒写一次磁盘
+        """
+        counts = {'chars': chars, 'tokens': tokens, 'requests': requests, 'errors': errors}
+        with self.lock:
+            engine = self.load().setdefault(api, {'day': {}, 'month': {}})
+            for period, key in zip(['day', 'month'], self.periods()):
+                usage = engine[period].setdefault(key, dict.fromkeys(USAGE_FIELDS, 0))
+                for field, count in counts.items():
+                    usage[field] += count
+            for day in sorted(engine['day'])[:-KEEP_DAYS]:
+                del engine['day'][day]
+            self.dirty = True
+            if time.monotonic() - self.saved_at > 5:
+                self.save()
+
+    def flush(self):
+        with self.lock:
+            if self.dirty:
+                self.save()
+
+    def usage(self, api: str, period: str = 'month') -> dict:
+        """
+        :param period day或month
+        :return dict{统计项: 当期累计值}
+        """
+        key = self.periods()[0 if period == 'day' else 1]
+        with self.lock:
+            usage = self.load().get(api, {}).get(period, {}).get(key, {})
+            return {field: usage.get(field, 0) for field in USAGE_FIELDS}
+
+    @staticmethod
+    def cap(api: str):
+        """
+        计费接口的按月上限，为0时不限
+        :return tuple(计费的接口, 统计项, 上限)，不计费的接口返回None
+        """
+        if api == '0':
+            return '0', 'chars', cfg.get(cfg.baiduMonthlyCap) * 10000
+        elif api in ['2', '4']:
+            return '2', 'tokens', cfg.get(cfg.gptMonthlyCap) * 10000
+        return None
+
+    def check(self, api: str, chars: int = 0, tokens: int = 0):
+        """
+        若本批用量会使当月累计超过上限则抛出BudgetExceededError
+        """
+        cap = self.cap(api)
+        if not cap or not cap[2]:
+            return
+        billed_api, field, limit = cap
+        used = self.usage(billed_api)[field]
+        needed = chars if field == 'chars' else tokens
+        if used + needed > limit:
+            unit = '字符' if field == 'chars' else 'tokens'
+            raise BudgetExceededError(f'本月用量{used}{unit}，继续翻译将超过上限{limit}{unit}，已暂停，'
+                                      f'已完成部分已保存')
+
+    @staticmethod
+    def project(api: str, texts: list, request_count: int) -> dict:
+        """
+        估算翻译texts所需的用量，OpenAI的token数按输入输出各一份原文加提示词估算
+        """
+        chars = sum(len(text_) for text_ in texts)
+        if api == '0':
+            return {'chars': chars, 'tokens': 0, 'requests': request_count}
+        elif api in ['2', '4']:
+            # 级联翻译只有低置信度的条目会交给OpenAI，此处为上限
+            return {'chars': chars, 'tokens': estimate_tokens(chars) * 2 + PROMPT_TOKENS * request_count,
+                    'requests': request_count}
+        return {'chars': chars, 'tokens': 0, 'requests': 0}
+
+    def summary(self, api: str) -> str:
+        cap = self.cap(api)
+        if not cap:
+            return ''
+        billed_api = cap[0]
+        day = self.usage(billed_api, 'day')
+        month = self.usage(billed_api, 'month')
+        return '今日用量:%d字符/%dtokens/%d次请求(失败%d次)，本月用量:%d字符/%dtokens/%d次请求(失败%d次)' % (
+            day['chars'], day['tokens'], day['requests'], day['errors'],
+            month['chars'], month['tokens'], month['requests'], month['errors'])
+
+
+usage_ledger = UsageLedger()
@@ -4,28 +4,36 @@ import hashlib
 import json
 import os
 import re
+import threading
 import time
 import zipfile
 from collections import OrderedDict
-from functools import wraps
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError, as_completed
 from pathlib import Path
 
-import func_timeout.exceptions
-from openai import OpenAI
 import ahocorasick
-import requests
 import snbtlib
 from PyQt5.QtCore import QThread, pyqtSignal, QObject
 from nbt import nbt
 from nbt.nbt import TAG
-from func_timeout import func_set_timeout
-
-from transformers import MarianTokenizer, MarianMTModel
 
+from common.baidu_client import BaiduClient, TRANSLATE_ERROR_PREFIX
 from common.config import cfg
+from common.endpoint_pool import parse_endpoints, Endpoint
+from common.engine_registry import engine_registry, EngineScheduler, gpt_capability
+from common.engine_session import engine_session, RETRYABLE_ERRORS, TIMEOUT_ERRORS, THROTTLE_ERRORS
+from common.flow_control import RetryPolicy, LatencyRecorder, HedgeBudget, HEDGE_MIN_SAMPLES, HEDGE_WORKERS
+from common.model_registry import model_registry, LOCAL_MODEL_PATH, CT2_MODEL_PATH, DECODE_PRESETS, \
+    MAX_DECODE_LENGTH
+from common.placeholder import PlaceholderMasker, PLACEHOLDER_PATTERN, COLOR_PATTERN
+from common.process_pool import get_sharded_translator
+from common.prompt_builder import PromptBuilder
+from common.segmenter import segment_batch, stitch_batch
+from common.single_flight import single_flight, SINGLE_FLIGHT_TIMEOUT
 from common.terms_dict import TERMS
+from common.translation_memory import translation_memory, normalize
+from common.usage_ledger import usage_ledger, BudgetExceededError
 
-MAGIC_WORD = r'{xdawned}'  # 先在术语库中记录，保证其不被翻译
 
 
 def parse_json_file(path):
@@ -58,23 +66,6 @@ def save_lang_file(data_: dict, path: str, text: str = None):
             f.write(text)
 
 
-def func_timer(function):
-    """
-    用装饰器实现函数计时
-    :param function: 需要计时的函数
-    :return: tuple(运算的结果,运行时间)
-    """
-
-    @wraps(function)
-    def function_timer(*args, **kwargs):
-        t0 = time.time()
-        result = function(*args, **kwargs)
-        t1 = time.time()
-        return result, round(t1 - t0, 2)
-
-    return function_timer
-
-
 def check_file_exists(directory_path, file_name):
     if os.path.exists(os.path.join(directory_path, file_name)):
         return directory_path + '/' + file_name
@@ -384,161 +375,583 @@ class Translator(QObject):
     app_secret = ''
     model = None
     tokenizer = None
-    access_token = None
+    baidu_client = None
     original = cfg.get(cfg.keepOriginal)
     spec_format = pyqtSignal(str)
-    client = None
+    openai_pool = None
+    ct2_translator = None
     model_name = cfg.get(cfg.modelName)
+    decode_preset = None  # 指定时覆盖配置中的解码预设
 
-    def __init__(self, from_lang: str, to_lang: str, key: str, secret: str):
+    def __init__(self, from_lang: str, to_lang: str, key: str, secret: str, api: str = None, load: bool = True):
+        """
+        :param load 是否立即加载模型或客户端，多进程离线翻译时模型只在子进程中加载
+        """
         super().__init__()
+        self.memory_hits = 0
+        self.memory_misses = 0
+        self.coalesced = 0
+        self.gpt_latency = LatencyRecorder(200)  # 单次对话请求的耗时，用于决定何时对冲
+        self.hedge_budget = HedgeBudget(cfg.get(cfg.gptHedgeBudget) / 100)
+        self.hedge_executor = ThreadPoolExecutor(max_workers=HEDGE_WORKERS)
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.fallback = None  # 主接口熔断时使用的备用Translator
+        self.fallback_sources = set()  # 由备用接口翻译的原文，不写入主接口的翻译记忆
+        self.fallback_lock = threading.Lock()
+        self.cascade_total = 0
+        self.cascade_escalated = 0
+        self.retry = RetryPolicy(cfg.get(cfg.maxRetries), retry_on=RETRYABLE_ERRORS,
+                                 on_error=self.handle_retry_error)
+        self.latency = LatencyRecorder()
         self.from_lang = from_lang
         self.to_lang = to_lang
         self.app_key = key
         self.app_secret = secret
-        if self.api == '1':
-            self.init_local_model()  # 加载模型
-
-    @staticmethod
-    def bracket(m: re.Match):
-        return "[&" + m.group(0) + "]"
-
-    @staticmethod
-    def debracket(m: re.Match):
-        return m.group(0)[2:-1]
+        if api is not None:
+            self.api = api
+        self.engine = engine_registry.get(self.api)
+        capability = self.engine.capability()
+        self.scheduler = EngineScheduler(capability, self.spec_format.emit,
+                                         engine_registry.limiter(self.api, capability.qps))
+        # 级联翻译交给OpenAI的条目另按OpenAI接口的能力调度
+        self.cascade_scheduler = EngineScheduler(gpt_capability(), self.spec_format.emit) if self.api == '4' else None
+        self.masker = PlaceholderMasker(protect_color=not self.use_local_model())
+        if load and self.engine.loader:
+            getattr(self, self.engine.loader)()  # 加载模型或客户端
+
+    def handle_retry_error(self, e: Exception):
+        # 限流时降低在途请求数
+        if isinstance(e, THROTTLE_ERRORS):
+            self.scheduler.throttled()
+
+    def use_local_model(self) -> bool:
+        # 离线模型认识彩色字符，无需额外预处理
+        return self.engine.local
 
     def pre_process(self, line: str):
+        """
+        略过不需要翻译的文本，并将受保护的片段替换为占位符
+        :return tuple(替换后的文本, 被替换的片段)，不需要翻译时返回None
+        """
         if line.find('.jpg') + line.find('.png') != -2:
             self.spec_format.emit('注意:检测到图片格式，不翻译')
             return None
         if line.find(r'{\"') != -1:
             return None
-        line = line.replace('\\\\&', 'PPP')
-        if self.model is None:
-            pattern = re.compile(r'&([a-z,0-9]|#[0-9,A-F]{6})')
-            line = pattern.sub(self.bracket, line)
+        line, spans = self.masker.mask(line.replace('\\"', '"'))
+        kinds = {span[0] for span in spans}
+        if 'color' in kinds:
             self.spec_format.emit('注意:检测到彩色字符已预处理，不保证100%保留')
-        line = re.sub(r'#\w+:\w+\b', MAGIC_WORD, re.sub(r'\\"', '\"', line))
-        pattern = re.compile(r'(http|https)://(?:[-\w.]|(?:%[\da-fA-F]{2}))+')
-        if re.search(pattern, line):
-            self.spec_format.emit('注意:检测到包含网址，不翻译')
-            return None
-        return line
+        if 'ref' in kinds:
+            self.spec_format.emit('注意:检测到物品引用已处理，不保证100%安全')
+        return line, spans
 
-    def post_process(self, text_, translate):
-        if self.model is None:
-            pattern = re.compile(r'\[&&([a-z,0-9]|#[0-9,A-F]{6})]')
-            translate = pattern.sub(self.debracket, translate)
-            text_ = pattern.sub(self.debracket, text_)
+    def post_process(self, text_, translate, spans):
+        translate = self.masker.unmask(translate, spans)
         text_ = re.sub(r'(["\'])', r'\\\g<1>', text_)
-        quotes = re.findall(r'#\w+:\w+\b', text_)
-        if len(quotes) > 0:
-            self.spec_format.emit('注意:检测到物品引用已处理，不保证100%安全')
-            count = 0
-            index = translate.find(MAGIC_WORD)
-            while index != -1:
-                translate = re.sub(MAGIC_WORD, quotes[count], translate, 1)
-                count = count + 1
-                index = translate.find(MAGIC_WORD)
         return translate + "[--" + text_ + "--]" if self.original else translate
 
-    def get_access_token(self):
-        url = "https://aip.baidubce.com/oauth/2.0/token"
-        params = {
-            "grant_type": "client_credentials",
-            "client_id": self.app_key,
-            "client_secret": self.app_secret
-        }
-        response = requests.get(url, params=params, timeout=3)
-        result = response.json()
-        access_token = result["access_token"]
-        self.access_token = access_token
+    def pre_process_batch(self, texts: list) -> list:
+        """
+        批量预处理，略过不需要翻译的文本
+        :return list[(原文下标, 替换后的文本, 被替换的片段)]
+        """
+        processed = []
+        for i, text_ in enumerate(texts):
+            text_process = self.pre_process(text_)
+            if text_process is not None:
+                processed.append((i, *text_process))
+        return processed
+
+    def init_baidu_client(self):
+        self.baidu_client = BaiduClient(self.app_key, self.app_secret, self.from_lang, self.to_lang,
+                                        cfg.get(cfg.baiduPackChars), self.retry, cfg.get(cfg.requestTimeout),
+                                        cfg.get(cfg.baiduUrl), self.scheduler.limiter)
 
     def baidu_translate(self, text_: str):
-        text_process = self.pre_process(text_)
-        if text_process is None:
-            return text_
-        url_ = "https://aip.baidubce.com/rpc/2.0/mt/texttrans/v1"
-        headers = {
-            "Content-Type": "application/json;charset=utf-8"
-        }
-        body = {
-            "from": self.from_lang,
-            "to": self.to_lang,
-            "q": text_process
-        }
-        if not self.access_token:
-            self.get_access_token()
-        params_ = {
-            "access_token": self.access_token
-        }
-        response_ = requests.post(url_, headers=headers, params=params_, json=body, timeout=5)
-        result_ = response_.json()
-        try:
-            translated_text = result_["result"]["trans_result"][0]["dst"]
-        except Exception as e:
-            translated_text = f"翻译出错：{str(e)}"
-        return self.post_process(text_, translated_text)
+        return self.baidu_batch_translate([text_])[0]
+
+    def baidu_batch_translate(self, texts: list, keys: list = None):
+        """
+        百度翻译，调度器按打包字符数拆分后每次传入一个请求的文本
+        :param texts 原文列表
+        :return 译文列表，与原文一一对应
+        """
+        if not self.baidu_client:
+            self.init_baidu_client()
+        results = list(texts)
+        processed = self.pre_process_batch(texts)
+        outputs = self.baidu_client.translate_many([item[1] for item in processed])
+        for (i, _, spans), output in zip(processed, outputs):
+            results[i] = self.post_process(texts[i], output, spans)
+        return results
 
     def init_local_model(self):
-        self.model = MarianMTModel.from_pretrained("./models/minecraft-en-zh")
-        self.tokenizer = MarianTokenizer.from_pretrained("./models/minecraft-en-zh")
+        self.model, self.tokenizer = model_registry.get_marian()
+
+    def init_ct2_model(self):
+        self.ct2_translator, self.tokenizer = model_registry.get_ct2()
+
+    def ct2_generate(self, sentences: list) -> list:
+        """
+        CTranslate2 int8模型推理，内部会按长度排序分批
+        """
+        source_tokens = [self.tokenizer.convert_ids_to_tokens(self.tokenizer.encode(sentence))
+                         for sentence in sentences]
+        preset = DECODE_PRESETS[self.preset()]
+        translated = self.ct2_translator.translate_batch(
+            source_tokens,
+            max_batch_size=cfg.get(cfg.localBatchSize),
+            beam_size=preset['num_beams'],
+            max_decoding_length=self.decode_length(max(len(tokens) for tokens in source_tokens)))
+        return [self.tokenizer.decode(self.tokenizer.convert_tokens_to_ids(result.hypotheses[0]),
+                                      skip_special_tokens=True) for result in translated]
+
+    def ct2_batch_translate(self, texts: list, keys: list = None):
+        """
+        使用CTranslate2 int8模型批量翻译
+        :param texts 原文列表
+        :return 译文列表，与原文一一对应
+        """
+        if not all([self.ct2_translator, self.tokenizer]):
+            self.init_ct2_model()
+        return self.segmented_translate(texts, self.ct2_generate)
+
+    def local_generate(self, sentences: list) -> list:
+        return self.local_generate_scored(sentences, scored=False)[0]
+
+    def local_generate_scored(self, sentences: list, scored: bool = True):
+        """
+        离线模型推理，按长度分桶后以填充批次送入模型
+        :param scored 是否计算置信度，只有级联翻译需要，否则不保留每一步的得分以节省内存
+        :return tuple(译文列表, 置信度列表)，置信度为生成token的平均概率，不计算时为0
+        """
+        outputs = [''] * len(sentences)
+        confidences = [0.0] * len(sentences)
+        # 长度相近的文本放在同一批，减少填充带来的无效计算
+        order = sorted(range(len(sentences)), key=lambda k: len(sentences[k]))
+        batch_size = cfg.get(cfg.localBatchSize)
+        for start in range(0, len(order), batch_size):
+            bucket = order[start:start + batch_size]
+            inputs = self.tokenizer([sentences[k] for k in bucket], return_tensors="pt", padding=True)
+            num_beams = DECODE_PRESETS[self.preset()]['num_beams']
+            max_new_tokens = self.decode_length(inputs['input_ids'].shape[1])
+            if not scored:
+                sequences = self.model.generate(**inputs, num_beams=num_beams, max_new_tokens=max_new_tokens)
+                decoded = self.tokenizer.batch_decode(sequences, skip_special_tokens=True)
+                for k, output in zip(bucket, decoded):
+                    outputs[k] = output
+                continue
+            translated = self.model.generate(**inputs,
+                                             num_beams=num_beams,
+                                             max_new_tokens=max_new_tokens,
+                                             output_scores=True,
+                                             return_dict_in_generate=True)
+            if num_beams > 1:
+                scores = translated.sequences_scores.exp().tolist()  # 束搜索已按长度归一化
+            else:
+                transition = self.model.compute_transition_scores(translated.sequences, translated.scores,
+                                                                  normalize_logits=True)
+                mask = translated.sequences[:, 1:] != self.tokenizer.pad_token_id
+                # 结束后的填充位置可能为-inf(pad被bad_words_ids禁止)，乘以0会得到NaN，需先置零
+                scores = (transition.masked_fill(~mask, 0).sum(1) / mask.sum(1).clamp(min=1)).exp().tolist()
+            decoded = self.tokenizer.batch_decode(translated.sequences, skip_special_tokens=True)
+            for k, output, score in zip(bucket, decoded, scores):
+                outputs[k] = output
+                confidences[k] = score
+        return outputs, confidences
+
+    def preset(self) -> str:
+        # 每次读取配置，设置中切换预设后立即生效
+        return self.decode_preset or cfg.get(cfg.decodePreset)
+
+    def decode_length(self, source_length: int) -> int:
+        """
+        根据原文token数计算生成长度上限，快速预设下按比例收紧，避免短文本浪费解码步数
+        """
+        ratio = DECODE_PRESETS[self.preset()]['length_ratio']
+        if not ratio:
+            return MAX_DECODE_LENGTH
+        return min(MAX_DECODE_LENGTH, int(source_length * ratio) + 8)
 
     def local_translate(self, text_: str):
+        return self.local_batch_translate([text_])[0]
+
+    def local_batch_translate(self, texts: list, keys: list = None):
+        """
+        离线模型批量翻译
+        :param texts 原文列表
+        :return 译文列表，与原文一一对应
+        """
         if not all([self.model, self.tokenizer]):
             self.init_local_model()
-        text_process = self.pre_process(text_)
-        if text_process is None:
-            return text_
-        input_ids = self.tokenizer.encode(text_process, return_tensors="pt")
-        translated = self.model.generate(input_ids, max_length=128)
-        output = self.tokenizer.decode(translated[0], skip_special_tokens=True)
-        return self.post_process(text_, output)
+        return self.segmented_translate(texts, self.local_generate)
 
-    def init_openai_model(self):
-        self.client = OpenAI(
-            base_url=cfg.get(cfg.openaiUrl),
-            organization=cfg.get(cfg.orgId),
-            timeout=10,
-            api_key=cfg.get(cfg.secretKey)
-        )
+    def segmented_translate(self, texts: list, generate):
+        """
+        离线模型的公共流程：预处理后将长文本切分为句子，所有句子整批推理，再拼回并还原占位符
+        避免长任务描述超出生成长度被截断
+        :param generate 接收句子列表，返回对应译文列表
+        """
+        results = list(texts)
+        processed = self.pre_process_batch(texts)
+        if not processed:
+            return results
+        segments, layout = segment_batch([item[1] for item in processed])
+        outputs = stitch_batch(generate(segments), layout)
+        for (i, _, spans), output in zip(processed, outputs):
+            results[i] = self.post_process(texts[i], output, spans)
+        return results
 
     @staticmethod
-    def generate_prompt(text: str) -> str:
-        ref_data = [f'{item[1][0]}:{str(item[1][1])}' for item in global_aca.find(text.lower())]
-        ref_prefix = '\n'.join(ref_data)
-        prompt_dict = {
-            "tasks": f"Translate the text below about minecraft into Chinese\n"
-                     f"You can choose whether to refer to the following terms based on the context yourself:\n"
-                     f"Do not return any other content besides the translated text\n",
-            "terms": ref_prefix,
-            "text": text
-        }
-        prompt = json.dumps(prompt_dict, indent=2, ensure_ascii=False)
-        return prompt
+    def parity_ok(source: str, output: str) -> bool:
+        # 译文中的占位符与彩色字符数量应与原文一致
+        return (sorted(PLACEHOLDER_PATTERN.findall(source)) == sorted(PLACEHOLDER_PATTERN.findall(output)) and
+                len(COLOR_PATTERN.findall(source)) == len(COLOR_PATTERN.findall(output)))
 
-    def gpt_translate(self, text_: str):
+    def cascade_batch_translate(self, texts: list, keys: list = None):
+        """
+        级联翻译：离线模型先整批翻译，置信度低或占位符对不上的条目再交给OpenAI
+        :param texts 原文列表
+        :param keys 原文对应的键
+        :return 译文列表，与原文一一对应
+        """
+        if not all([self.model, self.tokenizer]):
+            self.init_local_model()
+        results = list(texts)
+        processed = self.pre_process_batch(texts)
+        if not processed:
+            return results
+        segments, layout = segment_batch([item[1] for item in processed])
+        outputs, confidences = self.local_generate_scored(segments)
+        stitched = stitch_batch(outputs, layout)
+        threshold = cfg.get(cfg.cascadeThreshold) / 100
+        escalated = []
+        for (i, text_process, spans), output, (start, count, _) in zip(processed, stitched, layout):
+            confidence = min(confidences[start:start + count])
+            if confidence < threshold or not self.parity_ok(text_process, output):
+                escalated.append(i)
+            else:
+                results[i] = self.post_process(texts[i], output, spans)
+        if escalated:
+            escalated_texts = [texts[i] for i in escalated]
+            projected = usage_ledger.project('2', escalated_texts, len(self.cascade_scheduler.plan(escalated_texts)))
+            usage_ledger.check('2', projected['chars'], projected['tokens'])
+            # 按OpenAI接口的能力拆分并发，与直接使用OpenAI时的批量大小、字符上限及自适应并发一致
+            llm_outputs = self.cascade_scheduler.run(self.gpt_batch_translate, escalated_texts,
+                                                     [keys[i] for i in escalated] if keys else None)
+            for i, output in zip(escalated, llm_outputs):
+                results[i] = output
+        self.cascade_total += len(processed)
+        self.cascade_escalated += len(escalated)
+        return results
+
+    def cascade_info(self) -> str:
+        rate = self.cascade_escalated / self.cascade_total * 100 if self.cascade_total else 0
+        return '级联翻译:%d/%d条(%.1f%%)交由OpenAI' % (self.cascade_escalated, self.cascade_total, rate)
+
+    def init_openai_model(self):
+        endpoints = parse_endpoints(cfg.get(cfg.openaiEndpoints), cfg.get(cfg.openaiUrl), cfg.get(cfg.secretKey))
+        self.openai_pool = engine_session.get_openai_pool(endpoints, cfg.get(cfg.orgId))
+
+    def gpt_request(self, text_process: str):
         params = dict(
             model=self.model_name,
-            messages=[{"role": "user", "content": self.generate_prompt(text_)}],
-            timeout=10
+            messages=prompt_builder.single_messages(text_process),
+            timeout=cfg.get(cfg.requestTimeout)
         )
-        if not self.client:
+        return self.gpt_complete(params).choices[0].message.content
+
+    def gpt_complete(self, params: dict, rows: int = 1):
+        """
+        发送一次对话请求，超过近期p95耗时仍未返回时在预算内再发一份对冲请求，先成功返回者为准
+        对冲请求优先发往另一个接口
+        :param rows 请求包含的条数，用于估计正常耗时
+        """
+        if not self.openai_pool:
             self.init_openai_model()
-        completion = self.client.chat.completions.create(**params)
-        return completion.choices[0].message.content
+        self.hedge_budget.record_request()
+        endpoint = self.openai_pool.acquire()
+        delay = self.hedge_delay(rows)
+        if delay is None:
+            return self.gpt_call(params, rows, endpoint)
+        primary = self.hedge_executor.submit(self.gpt_call, params, rows, endpoint)
+        try:
+            return primary.result(timeout=delay)
+        except FutureTimeoutError:
+            if not self.hedge_budget.try_hedge():
+                return primary.result()
+        self.hedged += 1
+        hedge = self.hedge_executor.submit(self.gpt_call, params, rows,
+                                           self.openai_pool.acquire(exclude=endpoint))
+        error = None
+        for future in as_completed([primary, hedge]):
+            try:
+                completion = future.result()
+            except Exception as e:
+                error = e
+                continue
+            if future is hedge:
+                self.hedge_wins += 1
+            return completion
+        raise error
+
+    def hedge_delay(self, rows: int):
+        """
+        :return 发出对冲请求前等待的秒数，不对冲时返回None
+        """
+        # 耗时主要是每次请求的固定开销，不与条数成正比，只参考条数相近的请求
+        if not cfg.get(cfg.gptHedgeBudget) or self.gpt_latency.samples(rows) < HEDGE_MIN_SAMPLES:
+            return None
+        return self.gpt_latency.percentile(95, rows)
 
-    @func_timer
-    @func_set_timeout(20)
-    def translate(self, text_: str):
-        if self.api == '0':
-            return self.baidu_translate(text_)
-        elif self.api == '1':
-            return self.local_translate(text_)
+    def gpt_call(self, params: dict, rows: int, endpoint: Endpoint):
+        """
+        向选定的接口发送一次对话请求，记录耗时与接口健康状态，并将token用量记入台账
+        每次失败后立即归还该接口，重试时重新从接口池中选择，尽量避开刚失败的接口
+        :param endpoint 首次尝试使用的接口，由openai_pool.acquire取得，请求结束后归还
+        """
+        next_endpoint = endpoint
+        failed_endpoint = None
+
+        def attempt():
+            nonlocal next_endpoint, failed_endpoint
+            current = next_endpoint or self.openai_pool.acquire(exclude=failed_endpoint)
+            next_endpoint = None
+            t0 = time.perf_counter()
+            try:
+                completion_ = current.client.chat.completions.create(**params)
+            except Exception:
+                self.openai_pool.release(current, False)
+                usage_ledger.record('2', errors=1)
+                failed_endpoint = current
+                raise
+            self.openai_pool.release(current)
+            self.gpt_latency.record('2', rows, time.perf_counter() - t0)
+            return completion_
+
+        completion = self.retry.call(attempt)
+        tokens = completion.usage.total_tokens if completion.usage else 0
+        usage_ledger.record('2', chars=sum(len(message['content']) for message in params['messages']),
+                            tokens=tokens)
+        return completion
+
+    def hedge_info(self) -> str:
+        return '对冲请求%d次，其中%d次先于原请求返回' % (self.hedged, self.hedge_wins)
+
+    def gpt_translate(self, text_: str):
+        return self.gpt_batch_translate([text_])[0]
+
+    def gpt_batch_translate(self, texts: list, keys: list = None):
+        """
+        多条文本以JSON数组的形式在一次对话中翻译，返回缺失或格式错误的条目退回逐条请求
+        :param texts 原文列表
+        :param keys 原文对应的键，为节省token不再发送，条目以下标区分
+        :return 译文列表，与原文一一对应
+        """
+        results = list(texts)
+        processed = self.pre_process_batch(texts)
+        ids = []
+        translated = {}
+        if len(processed) > 1:
+            messages, ids = prompt_builder.batch_messages([text_process for _, text_process, _ in processed])
+            params = dict(
+                model=self.model_name,
+                messages=messages,
+                timeout=cfg.get(cfg.requestTimeout) * len(processed)
+            )
+            # 接口错误直接抛出，交给调度器与熔断处理；只有返回内容无法解析时才退回逐条请求
+            completion = self.gpt_complete(params, len(processed))
+            try:
+                translated = prompt_builder.parse_batch_response(completion.choices[0].message.content or '')
+            except (IndexError, KeyError, ValueError):
+                translated = {}
+            if any(id_ not in translated for id_ in ids):
+                self.spec_format.emit('注意:批量翻译返回不完整，缺失部分改为逐条翻译')
+        for n, (i, text_process, spans) in enumerate(processed):
+            output = translated[ids[n]] if ids and ids[n] in translated else self.gpt_request(text_process)
+            results[i] = self.post_process(texts[i], output, spans)
+        return results
+
+    def memory_scope(self):
+        """
+        翻译记忆库中区分结果的(接口, 模型)
+        """
+        if self.api == '1':
+            model = LOCAL_MODEL_PATH
         elif self.api == '2':
-            return self.gpt_translate(text_)
+            model = self.model_name
+        elif self.api == '3':
+            model = CT2_MODEL_PATH
+        elif self.api == '4':
+            model = f'{LOCAL_MODEL_PATH}+{self.model_name}'
         else:
-            return text_
+            model = 'texttrans'
+        if self.api in ['1', '3', '4']:
+            model += f'|preset{self.preset()}'  # 不同解码预设的结果分开存放，质量预设不会取到快速预设的结果
+        if self.original:
+            model += '|original'  # 保留原文时结果带有原文后缀，单独存放
+        return self.api, model
+
+    def translate_with_memory(self, texts: list, engine, streaming: bool = False):
+        """
+        先查翻译记忆库，只把未命中的原文交给engine翻译，再将新结果写回
+        :param engine 接收未命中原文下标列表，返回对应译文列表
+        :param streaming 为True时engine的第二个参数为publish函数，每完成一部分就以(下标列表, 译文列表)调用，
+                         这部分结果立即写入翻译记忆库并交给等待同一原文的其它请求
+        """
+        scope = self.memory_scope()
+        memory = translation_memory.get_many(*scope, texts)
+        results = [memory.get(normalize(text_)) for text_ in texts]
+        missed = [i for i, trans in enumerate(results) if trans is None]
+        self.memory_hits += len(texts) - len(missed)
+        self.memory_misses += len(missed)
+        if missed:
+            # 其它组件正在翻译的原文不再重复请求，等待其结果
+            flight_keys = [(*scope, normalize(texts[i])) for i in missed]
+            owned, shared = single_flight.claim(flight_keys)
+            owned_keys = [flight_keys[j] for j in owned]
+            owned = [missed[j] for j in owned]
+            published = set()
+
+            def publish(indices: list, outputs_: list):
+                single_flight.publish([(*scope, normalize(texts[i])) for i in indices], outputs_)
+                pairs = []
+                for i, output in zip(indices, outputs_):
+                    if output != texts[i] and not output.startswith(TRANSLATE_ERROR_PREFIX) and \
+                            normalize(texts[i]) not in self.fallback_sources:
+                        pairs.append((texts[i], output))
+                translation_memory.put_many(*scope, pairs)
+                published.update(indices)
+
+            try:
+                if not owned:
+                    outputs = []
+                else:
+                    outputs = engine(owned, publish) if streaming else engine(owned)
+            except BaseException as e:
+                single_flight.fail(owned_keys, e)  # 已发布的键不受影响
+                raise
+            rest = [n for n, i in enumerate(owned) if i not in published]
+            publish([owned[n] for n in rest], [outputs[n] for n in rest])
+            for i, output in zip(owned, outputs):
+                results[i] = output
+            stalled = []
+            for j, future in shared:
+                try:
+                    results[missed[j]] = future.result(timeout=SINGLE_FLIGHT_TIMEOUT)
+                except FutureTimeoutError:
+                    single_flight.forget(flight_keys[j], future)
+                    stalled.append(missed[j])
+            if stalled:
+                # 发起方被终止或卡住时自行翻译
+                stalled_outputs = engine(stalled, lambda indices, outputs_: None) if streaming else engine(stalled)
+                for i, output in zip(stalled, stalled_outputs):
+                    results[i] = output
+            self.coalesced += len(shared)
+        return results
+
+    def project_usage(self, texts: list) -> dict:
+        """
+        估算翻译texts的用量，翻译记忆库已命中的原文不计
+        """
+        memory = translation_memory.get_many(*self.memory_scope(), texts)
+        missed = [text_ for text_ in texts if normalize(text_) not in memory]
+        return usage_ledger.project(self.api, missed, len(self.scheduler.plan(missed)))
+
+    def memory_info(self) -> str:
+        total = self.memory_hits + self.memory_misses
+        rate = self.memory_hits / total * 100 if total else 0
+        info = '翻译记忆命中:%d/%d(%.1f%%)' % (self.memory_hits, total, rate)
+        if self.coalesced:
+            info += '，与其它请求合并%d条' % self.coalesced
+        return info
+
+    def translate(self, text_: str):
+        return self.batch_translate([text_])[0]
+
+    def batch_translate(self, texts: list, keys: list = None):
+        """
+        批量翻译，优先使用翻译记忆库
+        :param texts 原文列表
+        :param keys 原文对应的键，OpenAI批量翻译时用于对应返回结果
+        :return 译文列表，与原文一一对应
+        """
+        def engine(missed: list):
+            return self.engine_batch_translate([texts[i] for i in missed],
+                                               [keys[i] for i in missed] if keys else None)
+
+        return self.translate_with_memory(texts, engine)
+
+    def engine_batch_translate(self, texts: list, keys: list = None):
+        """
+        由调度器按接口能力拆分为单次请求并发执行，用量将超过上限时抛出BudgetExceededError
+        """
+        if self.api != '4':  # 级联翻译在交给OpenAI前单独检查
+            projected = usage_ledger.project(self.api, texts, len(self.scheduler.plan(texts)))
+            usage_ledger.check(self.api, projected['chars'], projected['tokens'])
+        return self.scheduler.run(self.engine_request, texts, keys)
+
+    def engine_request(self, texts: list, keys: list = None):
+        """
+        调用翻译接口完成一次请求，并记录耗时
+        主接口连续失败熔断后改由备用接口翻译，冷却后再放行探测请求
+        """
+        breaker = engine_registry.breaker(self.api)
+        fallback_api = self.fallback_api()
+        if fallback_api and not breaker.allow():
+            return self.fallback_translate(texts, keys)
+        t0 = time.perf_counter()
+        try:
+            results = getattr(self, self.engine.method)(texts, keys)
+        except BudgetExceededError:
+            breaker.cancel()  # 用量达到上限与接口是否可用无关，不计入失败，直接暂停翻译
+            raise
+        except Exception as e:
+            self.latency.record(self.api, len(texts), time.perf_counter() - t0, False)
+            self.handle_engine_failure(breaker)
+            if not fallback_api:
+                raise
+            self.spec_format.emit('注意:%s请求失败(%s)，本批改用%s' % (
+                self.engine.name, str(e), engine_registry.name(fallback_api)))
+            return self.fallback_translate(texts, keys)
+        self.latency.record(self.api, len(texts), time.perf_counter() - t0)
+        failed = [i for i, result in enumerate(results) if result.startswith(TRANSLATE_ERROR_PREFIX)]
+        if failed and len(failed) == len(results):
+            self.handle_engine_failure(breaker)
+        elif breaker.success():
+            self.spec_format.emit('%s已恢复' % self.engine.name)
+        if failed and fallback_api:
+            outputs = self.fallback_translate([texts[i] for i in failed],
+                                              [keys[i] for i in failed] if keys else None)
+            for i, output in zip(failed, outputs):
+                results[i] = output
+        return results
+
+    def fallback_api(self):
+        fallback_api = cfg.get(cfg.fallbackApi)
+        return fallback_api if fallback_api not in ['-1', self.api] else None
+
+    def handle_engine_failure(self, breaker):
+        if breaker.failure() and self.fallback_api():
+            self.spec_format.emit('注意:%s连续失败，暂时改用%s翻译，%d秒后重试' % (
+                self.engine.name, engine_registry.name(self.fallback_api()), breaker.reset_timeout))
+
+    def fallback_translate(self, texts: list, keys: list = None):
+        """
+        交给备用接口翻译，结果只写入备用接口自己的翻译记忆
+        """
+        with self.fallback_lock:
+            if self.fallback is None:
+                self.fallback = Translator(self.from_lang, self.to_lang, self.app_key, self.app_secret,
+                                           api=self.fallback_api())
+            self.fallback_sources.update(normalize(text_) for text_ in texts)
+        return self.fallback.batch_translate(texts, keys)
+
+    def batch_size(self) -> int:
+        # 每次送入batch_translate的条数，恰好让所有在途请求满载
+        return self.scheduler.chunk_size()
 
 
 class Mod:
@@ -597,17 +1010,35 @@ class ACA:
                 self.aca.add_word(k, (k, v))
         self.aca.make_automaton()
 
-    def find(self, word: str) -> list:
+    def find(self, word: str, whole_word: bool = False, limit: int = 5) -> list:
+        """
+        :param whole_word 只保留前后不与字母或数字相连的匹配
+        :param limit 最多返回的条数，为0时不限
+        """
         res = []
         word = word.lower()
         for item in self.aca.iter(word):
+            if whole_word and not self.is_whole_word(word, item[0], len(item[1][0])):
+                continue
             res.append(item)
         if res:
             res.sort(key=lambda i: len(i[1][0]), reverse=True)  # 按匹配到术语的长度递减排序
-        return res[:5]
+        return res[:limit] if limit else res
+
+    @staticmethod
+    def is_whole_word(word: str, end: int, length: int) -> bool:
+        start = end - length + 1
+        before = word[start - 1] if start > 0 else ''
+        after = word[end + 1] if end + 1 < len(word) else ''
+        return not before.isalnum() and not after.isalnum()
 
 
 global_aca = ACA()
+prompt_builder = PromptBuilder(global_aca)
+
+
+class TranslateInterrupted(Exception):
+    """ 用户终止了翻译 """
 
 
 class LangTranslateThread(QThread):
@@ -617,10 +1048,11 @@ class LangTranslateThread(QThread):
     info = pyqtSignal(str)
     error = pyqtSignal(str)
     remain_time = pyqtSignal(str)
-    count = 0  # 总条数
+    count = 0  # 去重后的总条数
+    row_count = 0  # 去重前的总条数
     current_index = 0  # 当前指针
 
-    def __init__(self, lang, from_lang: str, to_lang: str, app_key: str, app_secret: str):
+    def __init__(self, lang, from_lang: str, to_lang: str, app_key: str, app_secret: str, api: str = None):
         """
         翻译Lang中原文，并放回其中
         :param lang Lang或者list[Lang]
@@ -628,49 +1060,143 @@ class LangTranslateThread(QThread):
         :param to_lang 目标语言
         :param app_key 百度翻译API
         :param app_secret 百度翻译API
+        :param api 使用的翻译接口，缺省时与Translator相同
         """
         super().__init__()
-        self.lang = lang
-        self.translator = Translator(from_lang, to_lang, app_key, app_secret)
+        self.langs = lang if isinstance(lang, list) else [lang]
+        self.unique_rows = OrderedDict()  # 规范化原文: 所有原文相同的行
+        self.sharded = (api if api is not None else Translator.api) in ['1', '3'] and cfg.get(cfg.localWorkers) > 1
+        self.translator = Translator(from_lang, to_lang, app_key, app_secret, api=api, load=not self.sharded)
         self.calculate_count()
 
     def run(self):
         try:
             self.translator.spec_format.connect(self.handle_emit_process_info)
-            if isinstance(self.lang, list):
-                for lang in self.lang:
-                    self.trans(lang)
+            if self.sharded:
+                self.trans_sharded()
             else:
-                self.trans(self.lang)
-        except func_timeout.exceptions.FunctionTimedOut:
+                self.trans()
+        except BudgetExceededError as e:
+            self.save_cache()  # 保留已完成部分，调整上限后可继续
+            usage_ledger.flush()
+            self.error.emit(str(e))
+        except TIMEOUT_ERRORS:
             self.error.emit("  请求超时，请检查你的接口配置是否正确")
         except Exception as e:
             self.error.emit(str(e))
         else:
             self.finished.emit()
 
-    def trans(self, lang):
-        count = len(lang.lang_bilingual_list)
+    def trans(self):
+        # 所有文件中原文相同的行只翻译一次，再将结果填回每一行
+        self.info.emit('共%d条，去重后需翻译%d条' % (self.row_count, self.count))
+        groups = list(self.unique_rows.values())
         str_count = 0
-        for index in range(0, count):
-            self.current_index += 1
-            progress = (index + 1) / count * 100
-            str_count += len(lang.lang_bilingual_list[index][1])
-            self.progress.emit(progress)
-            self.index.emit('翻译进度:%s,已耗字符：%s' % (str(index + 1), str(str_count)))
-            self.info.emit('正在翻译:%s' % lang.lang_bilingual_list[index][1])
-            trans, single_run_time = self.translator.translate(lang.lang_bilingual_list[index][1])
+        # 由调度器按接口能力规划每块的条数与字符数
+        for indices in self.translator.scheduler.chunks([rows[0][1] for rows in groups]):
+            if self.isInterruptionRequested():
+                self.info.emit('已终止翻译，已完成部分已保存')
+                break
+            chunk = [groups[i] for i in indices]
+            for rows in chunk:
+                self.info.emit('正在翻译:%s' % rows[0][1])
+            t0 = time.perf_counter()
+            trans_list = self.translator.batch_translate([rows[0][1] for rows in chunk],
+                                                         [rows[0][0] for rows in chunk])
+            single_run_time = (time.perf_counter() - t0) / len(chunk)
+            for rows, trans in zip(chunk, trans_list):
+                self.current_index += 1
+                str_count += len(rows[0][1])
+                for row in rows:
+                    row[2] = trans
+                    row[3] = trans
+                if normalize(rows[0][1]) in self.translator.fallback_sources:
+                    self.info.emit('翻译结果为(备用接口%s):%s' % (
+                        engine_registry.name(self.translator.fallback.api), trans))
+                else:
+                    self.info.emit('翻译结果为:%s' % trans)
+                self.progress.emit(int(self.current_index / self.count * 100))
+                self.index.emit('翻译进度:%s,已耗字符：%s' % (str(self.current_index), str(str_count)))
             self.remain_time.emit(self.estimated_time_remaining(single_run_time))
-            lang.lang_bilingual_list[index][2] = trans
-            lang.lang_bilingual_list[index][3] = trans
-            self.info.emit('翻译结果为:%s' % trans)
         # 保存缓存文件
-        lang.save_cache()
+        self.save_cache()
+        self.info.emit(self.translator.memory_info())
+        self.info.emit(self.translator.latency.summary())
+        if self.translator.api == '4':
+            self.info.emit(self.translator.cascade_info())
+        if self.translator.hedged:
+            self.info.emit(self.translator.hedge_info())
+        if self.translator.openai_pool and len(self.translator.openai_pool) > 1:
+            self.info.emit('OpenAI接口:%s' % self.translator.openai_pool.summary())
+        usage_ledger.flush()
+        if usage_ledger.summary(self.translator.api):
+            self.info.emit(usage_ledger.summary(self.translator.api))
+
+    def trans_sharded(self):
+        # 多进程离线翻译，每完成一个分片就把结果填回并更新进度
+        workers = cfg.get(cfg.localWorkers)
+        self.info.emit('共%d条，去重后需翻译%d条，使用%d个进程' % (self.row_count, self.count, workers))
+        groups = list(self.unique_rows.values())
+        pool = get_sharded_translator(self.translator.api, workers)
+        t0 = time.perf_counter()
+        str_count = 0
+        filled = set()
+
+        def engine(missed: list, publish):
+            outputs = [''] * len(missed)
+            # 按长度排序后再切分，同一分片乃至同一推理批内的文本长度相近，减少填充
+            order = sorted(range(len(missed)), key=lambda j: len(groups[missed[j]][0][1]))
+            texts = [groups[missed[j]][0][1] for j in order]
+            keys = [groups[missed[j]][0][0] for j in order]
+            # 分片不少于一个推理批，条数较少时也尽量让每个进程都分到
+            shard_size = max(cfg.get(cfg.localBatchSize),
+                             min(self.translator.batch_size(), -(-len(missed) // workers)))
+            for start, shard in pool.translate_stream(texts, keys, shard_size, self.translator.preset(),
+                                                      cfg.get(cfg.localBatchSize)):
+                for j, trans in zip(order[start:start + len(shard)], shard):
+                    outputs[j] = trans
+                    self.fill_rows(groups[missed[j]], trans)
+                    filled.add(missed[j])
+                # 每完成一个分片就发布，预翻译与翻译建议不必等整次翻译结束
+                publish([missed[j] for j in order[start:start + len(shard)]], shard)
+                if self.isInterruptionRequested():
+                    # 未完成的分片没有译文，不能作为结果写入翻译记忆库
+                    raise TranslateInterrupted()
+            return outputs
+
+        try:
+            trans_list = self.translator.translate_with_memory([rows[0][1] for rows in groups], engine,
+                                                               streaming=True)
+        except TranslateInterrupted:
+            self.save_cache()
+            self.info.emit('已终止翻译，已完成部分已保存')
+            return
+        for i, trans in enumerate(trans_list):
+            if i not in filled:
+                self.fill_rows(groups[i], trans)  # 翻译记忆库命中的行
+        for rows in groups:
+            str_count += len(rows[0][1])
+        self.index.emit('翻译进度:%s,已耗字符：%s' % (str(self.count), str(str_count)))
+        self.save_cache()
+        self.info.emit(self.translator.memory_info())
+        self.info.emit('多进程翻译耗时%.2fs' % (time.perf_counter() - t0))
+
+    def fill_rows(self, rows: list, trans: str):
+        self.current_index += 1
+        for row in rows:
+            row[2] = trans
+            row[3] = trans
+        self.info.emit('翻译结果为:%s' % trans)
+        self.progress.emit(int(self.current_index / self.count * 100))
+
+    def save_cache(self):
+        for lang in self.langs:
+            lang.save_cache()
 
     def stop(self):
-        self.terminate()
-        self.wait()
-        self.finished.emit()
+        # 只请求终止，不在界面线程中等待当前块完成；run在块与块之间结束，保存已完成部分并发出finished
+        self.requestInterruption()
+        self.info.emit('正在终止，当前块完成后停止')
 
     def handle_emit_process_info(self, info: str):
         self.info.emit(info)
@@ -681,11 +1207,114 @@ class LangTranslateThread(QThread):
         minutes = (remain_time - seconds) / 60
         return f"预计还需: %.f分%.f秒" % (minutes, seconds)
 
-    def calculate_count(self):
-        # 计算长度
-        if isinstance(self.lang, list):
-            for item in self.lang:
-                self.count += len(item.lang_bilingual_list)
+    def projected_usage(self) -> str:
+        """
+        预估本次翻译的用量，并与本月已用量和上限对比，不计费的接口返回空字符串
+        """
+        cap = usage_ledger.cap(self.translator.api)
+        if not cap:
+            return ''
+        projected = self.translator.project_usage([rows[0][1] for rows in self.unique_rows.values()])
+        billed_api, field, limit = cap
+        used = usage_ledger.usage(billed_api)[field]
+        info = '预计请求%d次，消耗%d字符' % (projected['requests'], projected['chars'])
+        if field == 'tokens':
+            info += '，约%d tokens' % projected['tokens']
+        unit = '字符' if field == 'chars' else 'tokens'
+        info += '\n本月已用%d%s，' % (used, unit)
+        if limit:
+            info += '上限%d%s' % (limit, unit)
+            if used + projected[field] > limit:
+                info += '\n预计将超过上限，达到上限时会暂停翻译'
         else:
-            self.count = len(self.lang.lang_bilingual_list)
+            info += '未设置上限'
+        return info
+
+    def calculate_count(self):
+        # 按规范化原文分组并计算长度
+        for lang in self.langs:
+            for row in lang.lang_bilingual_list:
+                self.unique_rows.setdefault(normalize(row[1]), []).append(row)
+            self.row_count += len(lang.lang_bilingual_list)
+        self.count = len(self.unique_rows)
         self.remain_time.emit(self.estimated_time_remaining(0.2))
+
+
+class PrefetchTranslateThread(QThread):
+    """
+    编辑视图的预翻译
+    以最低优先级在后台翻译当前行及之后若干行，结果写入机翻列供翻译建议使用
+    用户跳转时丢弃旧目标，从新位置重新开始
+    """
+    translated = pyqtSignal(object, int, str)  # 所属数据, 行号, 机翻
+
+    def __init__(self):
+        super().__init__()
+        self.translator = None
+        self.data = []
+        self.index = 0
+        self.generation = 0  # 每次重新定位加一，用于判断目标是否已变化
+        self.attempted = set()  # 本次定位后已尝试过的行号，译文为空的行不再反复请求
+        self.exiting = False
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+
+    @staticmethod
+    def enabled() -> bool:
+        # 只对不计费的离线翻译预翻译，百度、OpenAI与级联翻译在后台预翻译会悄悄消耗额度
+        return cfg.get(cfg.prefetchRows) > 0 and not usage_ledger.cap(Translator.api)
+
+    def retarget(self, data: list, index: int):
+        with self.lock:
+            self.data = data
+            self.index = index
+            self.generation += 1
+            self.attempted = set()
+        self.wake.set()
+        if not self.isRunning() and not self.exiting:
+            self.start(QThread.LowestPriority)
+
+    def stop(self):
+        # 退出前等待当前小批量翻译结束
+        self.exiting = True
+        self.wake.set()
+        self.wait()
+
+    def pending(self):
+        """
+        :return tuple(目标版本, 数据, 还没有机翻且本次定位后未尝试过的行号)
+        """
+        with self.lock:
+            data = self.data
+            end = min(len(data), self.index + cfg.get(cfg.prefetchRows) + 1)
+            rows = [i for i in range(self.index, end) if data[i][0] and not data[i][3] and i not in self.attempted]
+            return self.generation, data, rows
+
+    def mark_attempted(self, generation: int, rows: list):
+        with self.lock:
+            if generation == self.generation:
+                self.attempted.update(rows)
+
+    def run(self):
+        if self.translator is None:
+            self.translator = Translator('en', 'zh', cfg.get(cfg.appKey), cfg.get(cfg.appSecret))
+        while not self.exiting:
+            self.wake.wait()
+            self.wake.clear()
+            while not self.exiting:
+                generation, data, rows = self.pending()
+                if not rows:
+                    break
+                batch = rows[:max(1, min(self.translator.batch_size(), 4))]  # 小批量，便于尽快响应跳转
+                try:
+                    trans_list = self.translator.batch_translate([data[i][1] for i in batch],
+                                                                 [data[i][0] for i in batch])
+                except Exception:
+                    break  # 出错时等待下次定位再试，不打扰用户
+                self.mark_attempted(generation, batch)
+                for i, trans in zip(batch, trans_list):
+                    if not data[i][3]:
+                        data[i][3] = trans
+                        self.translated.emit(data, i, trans)
+                if generation != self.generation:
+                    continue  # 目标已变化，从新位置重新计算
@@ -10,8 +10,9 @@ from qfluentwidgets import TableWidget, TextEdit, PushButton, SearchLineEdit, Li
     FluentIcon, InfoBar
 
 from common.config import cfg
+from common.engine_registry import engine_registry
 from common.style_sheet import StyleSheet
-from common.util import merge_dicts, parse_json_file, ACA, global_aca
+from common.util import merge_dicts, parse_json_file, ACA, global_aca, PrefetchTranslateThread
 from components.link_card import SuggestCardWidget
 from components.mc_color_edit import McColorEdit
 
@@ -119,6 +120,9 @@ class ReviewLangWidget(ScrollArea):
         self.str_count_all = 0
         self.translator_thread = None
         self.aca = global_aca
+        self.prefetch_thread = PrefetchTranslateThread()
+        self.prefetch_thread.translated.connect(self.handle_prefetched)
+        QApplication.instance().aboutToQuit.connect(self.prefetch_thread.stop)
 
         self.init_ui()
 
@@ -244,6 +248,13 @@ class ReviewLangWidget(ScrollArea):
                         '此节字符：%d     总字符：%d' % (len(self.data_array[self.current_index][1]), self.str_count_all))
                     self.dataUpdated.emit(self.data_array[self.current_index][1])
         self.update_suggest_card()
+        if self.prefetch_thread.enabled() and 0 <= self.current_index < len(self.data_array):
+            self.prefetch_thread.retarget(self.data_array, self.current_index)
+
+    def handle_prefetched(self, data, index, trans):
+        # 预翻译完成的正好是当前行时刷新翻译建议
+        if data is self.data_array and index == self.current_index:
+            self.update_suggest_card()
 
     def handleTextChanged(self):
         try:
@@ -286,13 +297,7 @@ class ReviewLangWidget(ScrollArea):
             current_trans = self.data_array[self.current_index][3]
             if current_trans:
                 trans = current_trans
-                api = cfg.get(cfg.translateApi)
-                if api == '0':
-                    api = '百度翻译'
-                elif api == '1':
-                    api = '离线翻译'
-                else:
-                    api = 'ChatGPT'
+                api = engine_registry.name(cfg.get(cfg.translateApi))
                 self.suggestPanel.addCard(author=api, trans=trans, ori=ori, icon=FluentIcon.GLOBE)
             # 术语词典
             term_search = self.aca.find(ori)
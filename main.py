@@ -1,6 +1,7 @@
 # coding:utf-8
 import os
 import sys
+from multiprocessing import freeze_support
 
 from PyQt5.QtCore import Qt, pyqtSignal, QEasingCurve, QUrl
 from PyQt5.QtGui import QIcon, QDesktopServices, QGuiApplication
@@ -11,6 +12,7 @@ from qframelesswindow import FramelessWindow, StandardTitleBar
 
 from common.activate import activate
 from common.config import cfg, SUPPORT_URL
+from common.model_registry import model_registry
 from common.signal_bus import signalBus
 from common.style_sheet import StyleSheet
 from components.avatar_widget import AvatarWidget
@@ -161,6 +163,7 @@ class MainWindow(FramelessWindow):
 
 
 if __name__ == '__main__':
+    freeze_support()  # 打包后多进程翻译需要
     # enable dpi scale
     if cfg.get(cfg.dpiScale) == "Auto":
         QApplication.setHighDpiScaleFactorRoundingPolicy(
@@ -184,4 +187,6 @@ if __name__ == '__main__':
                        screen_geometry.width(), screen_geometry.height() - 40)  # 减去任务栏高度（一般为40）
 
     window.show()
+    if cfg.get(cfg.preloadModel):
+        model_registry.warm_up(cfg.get(cfg.translateApi))
     app.exec_()
@@ -6,10 +6,11 @@ from qfluentwidgets import FluentIcon as FIF, OptionsConfigItem
 from qfluentwidgets import InfoBar
 from qfluentwidgets import (SettingCardGroup, SwitchSettingCard, OptionsSettingCard, PushSettingCard,
                             HyperlinkCard, PrimaryPushSettingCard, ScrollArea, ExpandLayout, CustomColorSettingCard,
-                            setTheme, setThemeColor, InfoBarPosition)
+                            setTheme, setThemeColor, InfoBarPosition, RangeSettingCard)
 
 from common.activate import activate
 from common.config import cfg, HELP_URL, FEEDBACK_URL, AUTHOR, VERSION, YEAR
+from common.model_registry import model_registry
 from common.style_sheet import StyleSheet
 from components.input_setting_card import PushEditSettingCard
 
@@ -71,10 +72,101 @@ class SettingInterface(ScrollArea):
             self.tr("选择使用的翻译API"),
             texts=[
                 self.tr('百度翻译'), self.tr('离线翻译')
-                , self.tr('OpenAI')
+                , self.tr('OpenAI'), self.tr('离线翻译(int8加速)'), self.tr('离线+OpenAI级联')
             ],
             parent=self.translateGroup
         )
+        self.requestTimeoutCard = RangeSettingCard(
+            cfg.requestTimeout,
+            FIF.HISTORY,
+            self.tr('超时时间(秒)'),
+            self.tr('单次接口调用的最长耗时，不影响离线翻译'),
+            parent=self.translateGroup
+        )
+        self.maxRetriesCard = RangeSettingCard(
+            cfg.maxRetries,
+            FIF.SYNC,
+            self.tr('重试次数'),
+            self.tr('请求超时、网络错误或被限流时的重试次数'),
+            parent=self.translateGroup
+        )
+        self.fallbackApiCard = OptionsSettingCard(
+            cfg.fallbackApi,
+            FIF.SYNC,
+            self.tr('备用翻译API'),
+            self.tr('翻译API连续失败时暂时改用此API翻译剩余条目，稍后自动重试原API'),
+            texts=[
+                self.tr('不使用'), self.tr('百度翻译'), self.tr('离线翻译'), self.tr('OpenAI'),
+                self.tr('离线翻译(int8加速)')
+            ],
+            parent=self.translateGroup
+        )
+        self.prefetchRowsCard = RangeSettingCard(
+            cfg.prefetchRows,
+            FIF.SEND,
+            self.tr('编辑视图预翻译行数'),
+            self.tr('使用离线翻译时在后台预先翻译之后的若干行，为0时关闭'),
+            parent=self.translateGroup
+        )
+        self.localBatchSizeCard = RangeSettingCard(
+            cfg.localBatchSize,
+            FIF.SPEED_HIGH,
+            self.tr('离线翻译批大小'),
+            self.tr('每批送入模型的条数，调大可提升CPU上的翻译速度'),
+            parent=self.translateGroup
+        )
+        self.preloadModelCard = SwitchSettingCard(
+            FIF.SPEED_MEDIUM,
+            self.tr('预加载离线模型'),
+            self.tr('启动软件或切换翻译API后在后台加载模型，开始翻译时无需等待'),
+            configItem=cfg.preloadModel,
+            parent=self.translateGroup
+        )
+        self.decodePresetCard = OptionsSettingCard(
+            cfg.decodePreset,
+            FIF.SPEED_MEDIUM,
+            self.tr('离线翻译解码预设'),
+            self.tr('批量预翻译可选快速，最终翻译可选质量'),
+            texts=[
+                self.tr('快速(贪心解码)'), self.tr('均衡(小束搜索)'), self.tr('质量(束搜索)')
+            ],
+            parent=self.translateGroup
+        )
+        self.localWorkersCard = RangeSettingCard(
+            cfg.localWorkers,
+            FIF.TILES,
+            self.tr('离线翻译进程数'),
+            self.tr('大于1时将任务切分到多个进程，每个进程各加载一份模型，适合核心数较多的机器'),
+            parent=self.translateGroup
+        )
+        self.baiduQpsCard = RangeSettingCard(
+            cfg.baiduQps,
+            FIF.SPEED_MEDIUM,
+            self.tr('百度翻译QPS'),
+            self.tr('与账户的QPS额度保持一致，避免触发限流'),
+            parent=self.translateGroup
+        )
+        self.baiduConcurrencyCard = RangeSettingCard(
+            cfg.baiduConcurrency,
+            FIF.SPEED_HIGH,
+            self.tr('百度翻译并发数'),
+            self.tr('初始同时进行的请求数，翻译时根据延迟与限流自动调整'),
+            parent=self.translateGroup
+        )
+        self.baiduMonthlyCapCard = RangeSettingCard(
+            cfg.baiduMonthlyCap,
+            FIF.CALENDAR,
+            self.tr('百度翻译每月用量上限(万字符)'),
+            self.tr('达到上限前暂停翻译，为0时不限'),
+            parent=self.translateGroup
+        )
+        self.baiduPackCharsCard = RangeSettingCard(
+            cfg.baiduPackChars,
+            FIF.ALIGNMENT,
+            self.tr('百度翻译打包字符数'),
+            self.tr('将多条文本合并到一个请求中发送，为0时不打包'),
+            parent=self.translateGroup
+        )
 
         self.appKeyCard = PushEditSettingCard(
             self.tr('保存'),
@@ -104,6 +196,15 @@ class SettingInterface(ScrollArea):
             cfg.openaiUrl,
             self.translateGroup
         )
+        self.openaiEndpointsCard = PushEditSettingCard(
+            self.tr('保存'),
+            FIF.BRUSH,
+            self.tr('多接口负载均衡'),
+            self.tr('填写多个"接口地址,密钥"并以分号分隔，请求将在其间均衡分配；为空时只使用上面的接口地址'),
+            self.tr('OpenaiEndpoints'),
+            cfg.openaiEndpoints,
+            self.translateGroup
+        )
         self.modelNameCard = PushEditSettingCard(
             self.tr('保存'),
             FIF.BRUSH,
@@ -113,6 +214,41 @@ class SettingInterface(ScrollArea):
             cfg.modelName,
             self.translateGroup
         )
+        self.gptBatchSizeCard = RangeSettingCard(
+            cfg.gptBatchSize,
+            FIF.ALIGNMENT,
+            self.tr('OpenAI批量条数'),
+            self.tr('每次对话合并翻译的条数，为1时逐条翻译'),
+            parent=self.translateGroup
+        )
+        self.gptConcurrencyCard = RangeSettingCard(
+            cfg.gptConcurrency,
+            FIF.SPEED_HIGH,
+            self.tr('OpenAI并发数'),
+            self.tr('初始同时进行的对话请求数，翻译时根据延迟与限流自动调整'),
+            parent=self.translateGroup
+        )
+        self.gptMonthlyCapCard = RangeSettingCard(
+            cfg.gptMonthlyCap,
+            FIF.CALENDAR,
+            self.tr('OpenAI每月用量上限(万tokens)'),
+            self.tr('达到上限前暂停翻译，为0时不限'),
+            parent=self.translateGroup
+        )
+        self.gptHedgeBudgetCard = RangeSettingCard(
+            cfg.gptHedgeBudget,
+            FIF.STOP_WATCH,
+            self.tr('OpenAI对冲请求比例(%)'),
+            self.tr('请求耗时超过近期p95时再发一份，先返回者为准；会额外消耗token，为0时关闭'),
+            parent=self.translateGroup
+        )
+        self.cascadeThresholdCard = RangeSettingCard(
+            cfg.cascadeThreshold,
+            FIF.FILTER,
+            self.tr('级联翻译置信度阈值(%)'),
+            self.tr('离线翻译置信度低于此值或占位符对不上时交由OpenAI重新翻译'),
+            parent=self.translateGroup
+        )
         self.orgIdCard = PushEditSettingCard(
             self.tr('保存'),
             FIF.BRUSH,
@@ -247,10 +383,28 @@ class SettingInterface(ScrollArea):
 
         self.translateGroup.addSettingCard(self.keepOriginalCard)
         self.translateGroup.addSettingCard(self.translateAPICard)
+        self.translateGroup.addSettingCard(self.requestTimeoutCard)
+        self.translateGroup.addSettingCard(self.maxRetriesCard)
+        self.translateGroup.addSettingCard(self.fallbackApiCard)
+        self.translateGroup.addSettingCard(self.prefetchRowsCard)
+        self.translateGroup.addSettingCard(self.localBatchSizeCard)
+        self.translateGroup.addSettingCard(self.decodePresetCard)
+        self.translateGroup.addSettingCard(self.localWorkersCard)
+        self.translateGroup.addSettingCard(self.preloadModelCard)
         self.translateGroup.addSettingCard(self.appKeyCard)
         self.translateGroup.addSettingCard(self.appSecretCard)
+        self.translateGroup.addSettingCard(self.baiduQpsCard)
+        self.translateGroup.addSettingCard(self.baiduConcurrencyCard)
+        self.translateGroup.addSettingCard(self.baiduPackCharsCard)
+        self.translateGroup.addSettingCard(self.baiduMonthlyCapCard)
         self.translateGroup.addSettingCard(self.openaiUrlCard)
+        self.translateGroup.addSettingCard(self.openaiEndpointsCard)
         self.translateGroup.addSettingCard(self.modelNameCard)
+        self.translateGroup.addSettingCard(self.gptBatchSizeCard)
+        self.translateGroup.addSettingCard(self.gptConcurrencyCard)
+        self.translateGroup.addSettingCard(self.gptMonthlyCapCard)
+        self.translateGroup.addSettingCard(self.gptHedgeBudgetCard)
+        self.translateGroup.addSettingCard(self.cascadeThresholdCard)
         self.translateGroup.addSettingCard(self.orgIdCard)
         self.translateGroup.addSettingCard(self.secretKeyCard)
 
@@ -278,6 +432,7 @@ class SettingInterface(ScrollArea):
 
         self.handle_api_change(self.translateAPICard.configItem)
         self.translateAPICard.optionChanged.connect(self.handle_api_change)
+        self.translateAPICard.optionChanged.connect(self.handle_model_preload)
 
     def __showRestartTooltip(self):
         InfoBar.success(
@@ -360,25 +515,46 @@ class SettingInterface(ScrollArea):
             lambda: QDesktopServices.openUrl(QUrl(FEEDBACK_URL)))
 
     def handle_api_change(self, option):
+        self.localBatchSizeCard.setVisible(option.value in ['1', '3', '4'])
+        self.decodePresetCard.setVisible(option.value in ['1', '3', '4'])
+        self.localWorkersCard.setVisible(option.value in ['1', '3'])
+        self.preloadModelCard.setVisible(option.value in ['1', '3', '4'])
+        self.baiduQpsCard.setVisible(option.value == '0')
+        self.baiduConcurrencyCard.setVisible(option.value == '0')
+        self.baiduPackCharsCard.setVisible(option.value == '0')
+        self.baiduMonthlyCapCard.setVisible(option.value == '0')
+        self.gptBatchSizeCard.setVisible(option.value in ['2', '4'])
+        self.gptConcurrencyCard.setVisible(option.value == '2')
+        self.gptMonthlyCapCard.setVisible(option.value in ['2', '4'])
+        self.gptHedgeBudgetCard.setVisible(option.value in ['2', '4'])
+        self.cascadeThresholdCard.setVisible(option.value == '4')
         if option.value == '0':
             self.secretKeyCard.setVisible(False)
             self.orgIdCard.setVisible(False)
             self.openaiUrlCard.setVisible(False)
+            self.openaiEndpointsCard.setVisible(False)
             self.modelNameCard.setVisible(False)
             self.appKeyCard.setVisible(True)
             self.appSecretCard.setVisible(True)
-        elif option.value == '1':
+        elif option.value in ['1', '3']:
             self.appKeyCard.setVisible(False)
             self.appSecretCard.setVisible(False)
             self.secretKeyCard.setVisible(False)
             self.orgIdCard.setVisible(False)
             self.openaiUrlCard.setVisible(False)
+            self.openaiEndpointsCard.setVisible(False)
             self.modelNameCard.setVisible(False)
-        elif option.value == '2':
+        elif option.value in ['2', '4']:
             self.appKeyCard.setVisible(False)
             self.appSecretCard.setVisible(False)
             self.secretKeyCard.setVisible(True)
             self.orgIdCard.setVisible(True)
             self.openaiUrlCard.setVisible(True)
+            self.openaiEndpointsCard.setVisible(True)
             self.modelNameCard.setVisible(True)
         self.translateGroup.adjustSize()
+
+    @staticmethod
+    def handle_model_preload(option):
+        if cfg.get(cfg.preloadModel):
+            model_registry.warm_up(option.value)
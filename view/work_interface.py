@@ -257,8 +257,22 @@ class WorkInterface(ScrollArea):
             )
 
     def handle_translate_start(self, lang, single=True):
+        if self.translator_thread and self.translator_thread.isRunning():
+            # 终止后当前块完成前线程仍在运行，此时替换会销毁仍在运行的线程
+            InfoBar.warning(
+                self.tr('请稍候'),
+                self.tr('上一次翻译尚未结束'),
+                duration=3000,
+                parent=self
+            )
+            return
         self.translator_thread = LangTranslateThread(lang, 'en', 'zh', cfg.get(cfg.appKey),
                                                      cfg.get(cfg.appSecret))
+        projected = self.translator_thread.projected_usage()
+        if projected:
+            w = MessageBox(self.tr('预计用量'), projected, self.window())
+            if not w.exec():
+                return
         self.trans_list = self.lang.lang_bilingual_list
         self.remain_time_label.setText('')
         self.translator_thread.finished.connect(lambda: self.on_translation_finished(single))